@@ -3,8 +3,23 @@ from google.cloud import storage
 from google.api_core.exceptions import Conflict
 import boto3
 import pyarrow.parquet as pq
+import pyarrow.compute as pc
 import pyarrow as pa
-from io import BytesIO
+from boto3.s3.transfer import TransferConfig
+import google_crc32c
+import base64
+import copy
+import hashlib
+import os
+import sys
+import tempfile
+import queue
+import threading
+import time
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 
 # ---------------- CONFIG ----------------
 PROJECT_ID = "project-cbe8701e-25df-447d-9da"
@@ -14,9 +29,376 @@ S3_BUCKET = "movielens-elt-project"  # SET YOUR S3 BUCKET
 S3_PREFIX = "gold"  # Folder in S3
 LOCATION = "US"
 AWS_REGION = "us-east-1"  # SET YOUR AWS REGION
+S3_PART_SIZE = 64 * 1024 * 1024  # Multipart upload part size (min 5 MB)
+S3_UPLOAD_CONCURRENCY = 4  # Multipart parts uploaded in parallel
+S3_ABORT_MULTIPART_DAYS = 7  # Lifecycle rule aborts multipart uploads no run resumed within this many days
+GCS_DOWNLOAD_WORKERS = 8  # Parallel ranged GET requests against GCS
+GCS_RANGE_SIZE = 32 * 1024 * 1024  # Byte range per GCS request
+PREFETCH_SHARDS = 2  # Shards downloaded ahead of the one being merged
+MAX_TRANSFERS = 4  # Concurrent GCS → S3 transfers in pipelined mode
+EXTRACT_POLL_SECONDS = 5  # How often pipelined mode checks on extract jobs
+EXPORT_STATE_PATH = "gold_export_state.json"  # Table/partition metadata of the last successful export
+GCS_STAGING_ROOT = "staging"  # Each run extracts under staging/<run id>/ in GCS_BUCKET
+GCS_STAGING_TTL_DAYS = 3  # Lifecycle rule removes staging shards left behind by failed runs
+TRANSFER_STATE_PATH = "gold_transfer_state.json"  # Staged shards and open multipart uploads of unfinished transfers
+METRICS_PATH = "gold_export_metrics.jsonl"  # One JSON line of timings and byte counts per exported unit
+
+# Parquet layout of exported files. Keys: row_group_size (rows), compression (codec or
+# {column: codec}), compression_level, use_dictionary and write_statistics (bool or column
+# list), sort_by (columns; the table is exported through an ordered EXPORT DATA query)
+DEFAULT_PARQUET_OPTIONS = {
+    'compression': 'snappy'
+}
+TABLE_PARQUET_OPTIONS = {
+    'fact_ratings': {
+        'row_group_size': 1_000_000,
+        'compression': 'zstd',
+        'sort_by': ['rating_date', 'user_id']
+    }
+}
+PARQUET_WRITER_OPTIONS = ('compression', 'compression_level', 'use_dictionary', 'write_statistics')
+
+# Hive-style key=value/ folders for large tables in partitioned export mode
+TABLE_PARTITION_COLUMNS = {
+    'fact_ratings': ['rating_year', 'rating_month'],
+    'fact_user_tags': ['tagged_year']
+}
+MAX_FILE_BYTES = 256 * 1024 * 1024  # Roll to a new file once a partition file reaches this size
+HIVE_NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+HIVE_ROW_GROUP_SIZE = 500_000  # Row group target for partitioned tables without their own row_group_size
+
+# Storage Read API export mode (no GCS staging) for tables up to this size
+STORAGE_API_MAX_BYTES = 2 * 1024 * 1024 * 1024
+STORAGE_READ_STREAMS = 4  # Parallel read streams per table
+STORAGE_QUEUE_BATCHES = 16  # Record batches buffered between the readers and the writer
+STORAGE_ROW_GROUP_SIZE = 500_000  # Row group target for Storage Read API exports without their own row_group_size
 # ----------------------------------------
 
 
+class TransferStats:
+    """Thread-safe byte and wall-clock counters per transfer direction ('download' / 'upload')"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bytes = {}
+        self.window = {}
+
+    def record(self, direction, num_bytes, started, ended):
+        with self.lock:
+            self.bytes[direction] = self.bytes.get(direction, 0) + num_bytes
+            first, last = self.window.get(direction, (started, ended))
+            self.window[direction] = (min(first, started), max(last, ended))
+
+    def mb_per_second(self, direction):
+        if direction not in self.window:
+            return 0.0
+        first, last = self.window[direction]
+        return self.bytes[direction] / (1024 * 1024) / max(last - first, 1e-6)
+
+    def summary(self):
+        return {
+            direction: {
+                'bytes': self.bytes[direction],
+                'mb': round(self.bytes[direction] / (1024 * 1024), 1),
+                'mb_per_second': round(self.mb_per_second(direction), 1)
+            }
+            for direction in self.bytes
+        }
+
+
+def process_peak_rss_mb():
+    """Highest resident memory of this process so far, in MB; None where the platform has no getrusage"""
+    try:
+        import resource  # POSIX only
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def transfer_metrics(stats, started, rows, shards=None, source='gcs'):
+    """Numbers describing one finished unit transfer, for ExportMetrics"""
+    seconds = time.monotonic() - started
+    return {
+        'source': source,
+        'shards': shards,
+        'rows': rows,
+        'read_bytes': stats.bytes.get('download', 0),
+        's3_bytes': stats.bytes.get('upload', 0),
+        'merge_seconds': round(seconds, 2),
+        'rows_per_second': round(rows / seconds) if seconds else None,
+        'transfer': stats.summary()
+    }
+
+
+def _job_seconds(job):
+    if job.started and job.ended:
+        return round((job.ended - job.started).total_seconds(), 2)
+    return None
+
+
+class ExportMetrics:
+    """
+    Per-unit export metrics. Each finished (or failed) unit is appended to path as one
+    JSON line; print_summary() ranks tables by the time they took. process_peak_rss_mb is
+    the process-wide peak so far when the unit finished, not a per-unit figure.
+    """
+
+    def __init__(self, path=METRICS_PATH):
+        self.path = path
+        self.run_id = None
+        self.lock = threading.Lock()
+        self.records = []
+
+    def emit(self, unit, **fields):
+        record = {
+            'run_id': self.run_id,
+            'unit': unit,
+            'table': unit.split('$')[0],
+            'finished_at': datetime.utcnow().isoformat(),
+            **fields,
+            'process_peak_rss_mb': process_peak_rss_mb()
+        }
+        with self.lock:
+            self.records.append(record)
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, default=str) + '\n')
+
+    def print_summary(self):
+        tables = {}
+        for record in self.records:
+            table = tables.setdefault(record['table'], {
+                'units': 0, 'failed': 0, 'seconds': 0.0, 'rows': 0, 'read_bytes': 0, 's3_bytes': 0, 'bytes_billed': 0
+            })
+            table['units'] += 1
+            table['failed'] += record.get('status') == 'failed'
+            table['seconds'] += (record.get('extract_seconds') or 0) + (record.get('merge_seconds') or 0)
+            for key in ('rows', 'read_bytes', 's3_bytes', 'bytes_billed'):
+                table[key] += record.get(key) or 0
+        
+        if not tables:
+            return
+        print(f"\n📊 Export metrics ({self.path or 'not saved'}), slowest first:")
+        for table_id, totals in sorted(tables.items(), key=lambda item: item[1]['seconds'], reverse=True):
+            failed = f", {totals['failed']} failed" if totals['failed'] else ""
+            print(f"   {table_id}: {totals['seconds']:,.1f}s over {totals['units']} unit(s){failed}, "
+                  f"{totals['rows']:,} rows, read {totals['read_bytes'] / 1024 / 1024:,.1f} MB, "
+                  f"wrote {totals['s3_bytes'] / 1024 / 1024:,.1f} MB to S3, "
+                  f"billed {totals['bytes_billed'] / 1024 / 1024:,.1f} MB")
+        total_seconds = sum(totals['seconds'] for totals in tables.values())
+        peak = process_peak_rss_mb()
+        print(f"   Total: {total_seconds:,.1f}s of extract + merge time")
+        if peak is not None:
+            print(f"   Process peak RSS over the whole run: {peak:,.1f} MB")
+
+
+def _etag_is_md5(response):
+    """S3 ETags are content MD5s only for unencrypted or SSE-S3 objects"""
+    return (response.get('ServerSideEncryption') in (None, 'AES256')
+            and not response.get('SSECustomerAlgorithm'))
+
+
+class S3MultipartWriter:
+    """
+    Write-only file object that streams into an S3 multipart upload.
+    Parts are uploaded by up to max_concurrency threads, with at most
+    2 * max_concurrency parts buffered in memory. Every part is sent with its MD5,
+    which S3 verifies; ETags are only compared to the MD5s as well when S3 reports
+    them to be MD5s (no SSE-KMS/SSE-C encryption).
+    Passing the upload_id of an unfinished upload resumes it: parts whose MD5
+    matches the ETag of a part already on S3 are not sent again.
+    """
+
+    def __init__(self, s3_client, bucket, key, part_size=S3_PART_SIZE,
+                 max_concurrency=S3_UPLOAD_CONCURRENCY, stats=None, upload_id=None):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.stats = stats
+        self.buffer = bytearray()
+        self.parts = []
+        self.position = 0
+        self.closed = False
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self.in_flight = threading.BoundedSemaphore(2 * max_concurrency)
+        self.part_digests = {}
+        self.existing_parts = {}
+        self.skipped_parts = 0
+        self.md5_etags = True
+        
+        if upload_id:
+            try:
+                paginator = s3_client.get_paginator('list_parts')
+                for page in paginator.paginate(Bucket=bucket, Key=key, UploadId=upload_id):
+                    for part in page.get('Parts', []):
+                        self.existing_parts[part['PartNumber']] = part['ETag']
+            except s3_client.exceptions.NoSuchUpload:
+                print(f"   ℹ️ Multipart upload for {key} no longer exists, starting over")
+                upload_id = None
+        self.upload_id = upload_id or s3_client.create_multipart_upload(Bucket=bucket, Key=key)['UploadId']
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        while len(self.buffer) >= self.part_size:
+            self._upload_part(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def writable(self):
+        return True
+
+    def _send_part(self, part_number, body):
+        try:
+            digest = hashlib.md5(body).digest()
+            self.part_digests[part_number] = digest
+            etag = f'"{digest.hex()}"'
+            if self.existing_parts.get(part_number) == etag:
+                self.skipped_parts += 1
+                return {'PartNumber': part_number, 'ETag': etag}
+            
+            started = time.monotonic()
+            response = self.s3_client.upload_part(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                PartNumber=part_number, Body=body, ContentMD5=base64.b64encode(digest).decode()
+            )
+            if not _etag_is_md5(response):
+                self.md5_etags = False
+            elif response['ETag'] != etag:
+                raise RuntimeError(f"Part {part_number} of {self.key} stored with ETag {response['ETag']}, expected {etag}")
+            if self.stats:
+                self.stats.record('upload', len(body), started, time.monotonic())
+            return {'PartNumber': part_number, 'ETag': response['ETag']}
+        finally:
+            self.in_flight.release()
+
+    def _upload_part(self, body):
+        # Blocks once enough parts are queued, which keeps memory bounded
+        self.in_flight.acquire()
+        self.parts.append(self.executor.submit(self._send_part, len(self.parts) + 1, body))
+
+    def close(self):
+        """Upload the last (possibly short) part and complete the upload"""
+        if self.closed:
+            return
+        if self.buffer or not self.parts:
+            self._upload_part(bytes(self.buffer))
+            self.buffer = bytearray()
+        parts = [future.result() for future in self.parts]
+        self.executor.shutdown()
+        response = self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            MultipartUpload={'Parts': parts}
+        )
+        self.closed = True
+        
+        # A multipart ETag is the MD5 of the concatenated part MD5s, suffixed with the part count
+        combined = b''.join(self.part_digests[part['PartNumber']] for part in parts)
+        expected = f'"{hashlib.md5(combined).hexdigest()}-{len(parts)}"'
+        if self.md5_etags and _etag_is_md5(response) and response['ETag'] != expected:
+            raise RuntimeError(f"s3://{self.bucket}/{self.key} completed with ETag {response['ETag']}, expected {expected}")
+        if self.skipped_parts:
+            print(f"   ↩️  Resumed upload: {self.skipped_parts} of {len(parts)} part(s) already on S3")
+
+    def abort(self):
+        """Discard everything uploaded so far"""
+        if not self.closed:
+            self.executor.shutdown(cancel_futures=True)
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            self.closed = True
+
+
+class RowGroupWriter:
+    """ParquetWriter that regroups incoming tables into row groups of row_group_size rows"""
+
+    def __init__(self, sink, schema, row_group_size=None, **writer_options):
+        self.writer = pq.ParquetWriter(sink, schema, **writer_options)
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.pending = []
+        self.pending_rows = 0
+
+    def write(self, table):
+        if table.num_rows == 0:
+            return
+        if not table.schema.equals(self.schema):
+            table = table.cast(self.schema)
+        if not self.row_group_size:
+            self.writer.write_table(table)
+            return
+        
+        self.pending.append(table)
+        self.pending_rows += table.num_rows
+        if self.pending_rows >= self.row_group_size:
+            # Write whole row groups and keep the remainder for the next call
+            combined = pa.concat_tables(self.pending)
+            full_rows = (combined.num_rows // self.row_group_size) * self.row_group_size
+            self.writer.write_table(combined.slice(0, full_rows), row_group_size=self.row_group_size)
+            remainder = combined.slice(full_rows)
+            self.pending = [remainder] if remainder.num_rows else []
+            self.pending_rows = remainder.num_rows
+
+    def flush(self):
+        """Write buffered rows now, as a (possibly short) row group"""
+        if self.pending:
+            self.writer.write_table(pa.concat_tables(self.pending), row_group_size=self.row_group_size)
+            self.pending = []
+            self.pending_rows = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def parquet_options_for(table_id):
+    """Default Parquet options with the table's overrides applied"""
+    return {**DEFAULT_PARQUET_OPTIONS, **TABLE_PARQUET_OPTIONS.get(table_id, {})}
+
+
+def start_ranged_download(blob, executor, range_size=GCS_RANGE_SIZE, stats=None):
+    """
+    Starts downloading a blob into a temp file as parallel byte-range requests.
+    Returns (path, futures); the file is complete once every future has finished.
+    """
+    fd, path = tempfile.mkstemp(suffix='.parquet')
+    os.ftruncate(fd, blob.size)
+    os.close(fd)
+    
+    def fetch_range(start, end):
+        started = time.monotonic()
+        data = blob.download_as_bytes(start=start, end=end)  # end is inclusive
+        # Own handle per range (os.pwrite isn't available on Windows)
+        with open(path, 'r+b') as out:
+            out.seek(start)
+            out.write(data)
+        if stats:
+            stats.record('download', len(data), started, time.monotonic())
+    
+    futures = [
+        executor.submit(fetch_range, start, min(start + range_size, blob.size) - 1)
+        for start in range(0, blob.size, range_size)
+    ]
+    return path, futures
+
+
+def file_crc32c(path, chunk_size=8 * 1024 * 1024):
+    """Base64 CRC32C of a local file, in the same form as GCS blob.crc32c"""
+    checksum = google_crc32c.Checksum()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            checksum.update(chunk)
+    return base64.b64encode(checksum.digest()).decode()
+
+
 def create_gcs_bucket(bucket_name, location, project_id):
     """Creates GCS bucket if it doesn't exist"""
     storage_client = storage.Client(project=project_id)
@@ -27,14 +409,69 @@ def create_gcs_bucket(bucket_name, location, project_id):
         print(f"✅ Created GCS bucket: {bucket_name}")
     except Conflict:
         print(f"ℹ️ Bucket already exists: {bucket_name}")
+    
+    ensure_staging_lifecycle(storage_client, bucket_name)
 
 
-def export_table_to_gcs_sharded(project_id, dataset_id, table_id, bucket_name):
-    """Exports BigQuery table to GCS (allows sharding for large tables)"""
-    bq_client = bigquery.Client(project=project_id)
+def ensure_staging_lifecycle(storage_client, bucket_name, days=GCS_STAGING_TTL_DAYS):
+    """Adds a lifecycle rule deleting staging shards after `days`, as a backstop for runs that never cleaned up"""
+    bucket = storage_client.get_bucket(bucket_name)
+    prefix = f"{GCS_STAGING_ROOT}/"
+    for rule in bucket.lifecycle_rules:
+        condition = rule.get('condition', {})
+        if rule.get('action', {}).get('type') == 'Delete' and condition.get('matchesPrefix') == [prefix]:
+            return
+    
+    bucket.add_lifecycle_delete_rule(age=days, matches_prefix=[prefix])
+    bucket.patch()
+    print(f"✅ Staging shards in gs://{bucket_name}/{prefix} expire after {days} day(s)")
+
+
+def new_run_id():
+    """Unique staging folder name for one export run"""
+    return f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def staging_prefix(run_id, dataset_id, shard_name):
+    """GCS folder holding one table's (or partition's) shards for a run"""
+    return f"{GCS_STAGING_ROOT}/{run_id}/{dataset_id}/{shard_name}/"
+
+
+def start_table_export(project_id, dataset_id, table_id, bucket_name, bq_client=None, partition_id=None,
+                       sort_by=None, run_id=None):
+    """
+    Submits the BigQuery → GCS extract job without waiting; returns (extract_job, gcs_prefix).
+    Shards go to their own folder under the run's staging prefix, so listing gcs_prefix
+    never picks up other runs or tables sharing a name prefix.
+    With partition_id only that partition is extracted (table$partition decorator).
+    With sort_by the table is written by an EXPORT DATA query ordered by those columns,
+    so every shard (and every row group merged from it) covers a narrow range of them.
+    """
+    bq_client = bq_client or bigquery.Client(project=project_id)
     
     table_ref = f"{project_id}.{dataset_id}.{table_id}"
-    destination_uri = f"gs://{bucket_name}/{dataset_id}/{table_id}-*.parquet"
+    shard_name = table_id
+    if partition_id:
+        table_ref = f"{table_ref}${partition_id}"
+        shard_name = f"{table_id}__{partition_id}"
+    gcs_prefix = staging_prefix(run_id or new_run_id(), dataset_id, shard_name)
+    destination_uri = f"gs://{bucket_name}/{gcs_prefix}{shard_name}-*.parquet"
+    
+    if sort_by and partition_id:
+        print(f"   ℹ️ sort_by is not applied to single-partition export {table_id}${partition_id}")
+    elif sort_by:
+        order_by = ', '.join(f"`{column}`" for column in sort_by)
+        query = f"""
+        EXPORT DATA OPTIONS (
+            uri = '{destination_uri}',
+            format = 'PARQUET',
+            compression = 'SNAPPY',
+            overwrite = true
+        ) AS
+        SELECT * FROM `{table_ref}`
+        ORDER BY {order_by}
+        """
+        return bq_client.query(query, location=LOCATION), gcs_prefix
     
     job_config = bigquery.ExtractJobConfig(
         destination_format=bigquery.DestinationFormat.PARQUET,
@@ -47,65 +484,502 @@ def export_table_to_gcs_sharded(project_id, dataset_id, table_id, bucket_name):
         job_config=job_config,
         location=LOCATION
     )
+    return extract_job, gcs_prefix
+
+
+def export_table_to_gcs_sharded(project_id, dataset_id, table_id, bucket_name, run_id=None):
+    """Exports BigQuery table to GCS (allows sharding for large tables)"""
+    extract_job, gcs_prefix = start_table_export(project_id, dataset_id, table_id, bucket_name, run_id=run_id)
     extract_job.result()
-    print(f"✔ Exported to GCS: {table_ref}")
-    return f"{dataset_id}/{table_id}"
+    print(f"✔ Exported to GCS: {project_id}.{dataset_id}.{table_id}")
+    return gcs_prefix
+
+
+def list_shard_blobs(gcs_client, gcs_bucket, gcs_prefix):
+    """Sharded Parquet files under a GCS prefix, in name order"""
+    return sorted(
+        (blob for blob in gcs_client.list_blobs(gcs_bucket, prefix=gcs_prefix) if blob.name.endswith('.parquet')),
+        key=lambda blob: blob.name
+    )
+
+
+def delete_staging_shards(gcs_client, gcs_bucket, gcs_prefix):
+    """Removes a unit's staging folder once its S3 upload has been verified"""
+    blobs = list(gcs_client.list_blobs(gcs_bucket, prefix=gcs_prefix))
+    if blobs:
+        gcs_client.bucket(gcs_bucket).delete_blobs(blobs)
+        print(f"   🧹 Removed {len(blobs)} staging file(s) from gs://{gcs_bucket}/{gcs_prefix}")
+
+
+def iter_shard_row_groups(blobs, stats, download_workers=GCS_DOWNLOAD_WORKERS, prefetch_shards=PREFETCH_SHARDS):
+    """
+    Yields (blob, row_group) for every row group of every shard, in order.
+    A shard without row groups yields one empty table, so its schema still reaches the writer.
+    Shards are fetched ahead as parallel ranged downloads into temp files,
+    which are removed as soon as they have been read.
+    """
+    downloads = {}
+    with ThreadPoolExecutor(max_workers=download_workers) as download_executor:
+        try:
+            for index, blob in enumerate(blobs):
+                # Keep up to prefetch_shards downloads running ahead of this shard
+                for ahead in blobs[index:index + 1 + prefetch_shards]:
+                    if ahead.name not in downloads:
+                        downloads[ahead.name] = start_ranged_download(ahead, download_executor, stats=stats)
+                
+                path, futures = downloads[blob.name]
+                for future in futures:
+                    future.result()
+                if file_crc32c(path) != blob.crc32c:
+                    raise RuntimeError(f"CRC32C mismatch downloading gs://{blob.bucket.name}/{blob.name}")
+                
+                print(f"   Merging: {blob.name}")
+                parquet_file = pq.ParquetFile(path)
+                if parquet_file.num_row_groups == 0:
+                    yield blob, parquet_file.schema_arrow.empty_table()
+                for i in range(parquet_file.num_row_groups):
+                    yield blob, parquet_file.read_row_group(i)
+                
+                parquet_file.close()
+                os.remove(path)
+                del downloads[blob.name]
+        finally:
+            # Leftover temp files from a failed run
+            for path, futures in downloads.values():
+                for future in futures:
+                    future.cancel()
+            download_executor.shutdown(wait=True)
+            for path, _ in downloads.values():
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def print_transfer_stats(transfer):
+    for direction, numbers in transfer.items():
+        print(f"   {direction.capitalize()}: {numbers['mb']:,} MB at {numbers['mb_per_second']:,} MB/s")
+
+
+def verify_s3_objects(s3_client, s3_bucket, expected_sizes):
+    """Raises if any uploaded object is missing from S3 or its size differs from what was written"""
+    for s3_key, expected in expected_sizes.items():
+        actual = s3_client.head_object(Bucket=s3_bucket, Key=s3_key)['ContentLength']
+        if actual != expected:
+            raise RuntimeError(f"s3://{s3_bucket}/{s3_key} is {actual:,} bytes, expected {expected:,}")
+
+
+def upload_row_groups(row_groups, s3_client, s3_bucket, s3_key, stats, parquet_options=None,
+                      part_size=S3_PART_SIZE, upload_concurrency=S3_UPLOAD_CONCURRENCY,
+                      transfer_state=None, unit_name=None):
+    """
+    Writes Arrow tables into one Parquet file on S3 through a multipart upload
+    and checks the stored object's size; returns the row count. Empty tables still
+    open the file, so an empty source gives a valid empty Parquet file; if nothing
+    arrives at all the upload is aborted and no object is written.
+    With transfer_state, the upload id is recorded under unit_name and a failed
+    upload is left open, so the next run re-sends only the parts S3 doesn't have.
+    """
+    parquet_options = parquet_options or DEFAULT_PARQUET_OPTIONS
+    writer_options = {key: parquet_options[key] for key in PARQUET_WRITER_OPTIONS if key in parquet_options}
+    
+    upload_id = None
+    if transfer_state is not None:
+        multipart = transfer_state.get(unit_name).get('multipart', {})
+        if multipart.get('key') == s3_key:
+            upload_id = multipart['upload_id']
+    
+    s3_writer = S3MultipartWriter(
+        s3_client, s3_bucket, s3_key, part_size=part_size, max_concurrency=upload_concurrency, stats=stats,
+        upload_id=upload_id
+    )
+    if transfer_state is not None:
+        transfer_state.update(unit_name, multipart={'key': s3_key, 'upload_id': s3_writer.upload_id})
+    
+    writer = None
+    total_rows = 0
+    try:
+        for row_group in row_groups:
+            if writer is None:
+                writer = RowGroupWriter(
+                    s3_writer, row_group.schema, parquet_options.get('row_group_size'), **writer_options
+                )
+            writer.write(row_group)
+            total_rows += row_group.num_rows
+        
+        if writer is None:
+            s3_writer.abort()
+            if transfer_state is not None:
+                transfer_state.update(unit_name, multipart={})
+            print(f"   ⚠️  No schema available for {s3_key}, nothing uploaded")
+            return 0
+        writer.close()
+        s3_writer.close()
+    except Exception:
+        if transfer_state is None:
+            s3_writer.abort()
+        else:
+            s3_writer.executor.shutdown(cancel_futures=True)
+            print(f"   ↩️  Kept multipart upload of {s3_key} open for the next run")
+        raise
+    
+    verify_s3_objects(s3_client, s3_bucket, {s3_key: s3_writer.tell()})
+    return total_rows
 
 
-def merge_and_upload_to_s3(gcs_bucket, gcs_prefix, s3_bucket, s3_key, aws_region):
+def merge_and_upload_to_s3(gcs_bucket, gcs_prefix, s3_bucket, s3_key, aws_region,
+                           download_workers=GCS_DOWNLOAD_WORKERS, prefetch_shards=PREFETCH_SHARDS,
+                           part_size=S3_PART_SIZE, upload_concurrency=S3_UPLOAD_CONCURRENCY,
+                           parquet_options=None, transfer_state=None, unit_name=None):
     """
-    Reads all sharded Parquet files from GCS, merges them, 
-    and uploads as a single file to S3
+    Merges all sharded Parquet files from GCS into a single Parquet file on S3.
+    Row groups are appended one at a time and the output goes out as a concurrent
+    multipart upload. parquet_options sets the output layout (see DEFAULT_PARQUET_OPTIONS).
+    Shards are checked against their GCS CRC32C; with transfer_state the upload is resumable.
+    Returns the transfer's metrics (see transfer_metrics).
     """
+    started = time.monotonic()
     gcs_client = storage.Client()
     s3_client = boto3.client('s3', region_name=aws_region)
     
     # List all sharded files in GCS
-    blobs = list(gcs_client.list_blobs(gcs_bucket, prefix=gcs_prefix))
+    blobs = list_shard_blobs(gcs_client, gcs_bucket, gcs_prefix)
     
     if len(blobs) == 0:
-        print(f"⚠️  No files found for {gcs_prefix}")
-        return
+        print(f"⚠️  No Parquet files found for {gcs_prefix}")
+        return None
     
     print(f"   Found {len(blobs)} file(s) in GCS")
     
-    # Read and merge all Parquet files
-    tables = []
-    for blob in blobs:
-        if blob.name.endswith('.parquet'):
-            print(f"   Reading: {blob.name}")
-            parquet_bytes = blob.download_as_bytes()
-            table = pq.read_table(BytesIO(parquet_bytes))
-            tables.append(table)
-    
-    if not tables:
-        print(f"⚠️  No valid Parquet files found")
+    stats = TransferStats()
+    row_groups = (row_group for _, row_group in iter_shard_row_groups(blobs, stats, download_workers, prefetch_shards))
+    total_rows = upload_row_groups(
+        row_groups, s3_client, s3_bucket, s3_key, stats, parquet_options, part_size, upload_concurrency,
+        transfer_state, unit_name
+    )
+    
+    metrics = transfer_metrics(stats, started, total_rows, len(blobs))
+    print(f"   Merged {len(blobs)} file(s) → {total_rows:,} rows")
+    print_transfer_stats(metrics['transfer'])
+    print(f"✅ Uploaded to S3: s3://{s3_bucket}/{s3_key}")
+    
+    return metrics
+
+
+class HivePartitionedWriter:
+    """
+    Routes rows into key=value/ folders under an S3 table prefix.
+    Each partition is spooled to a local Parquet file that is uploaded and
+    replaced by a new one once it reaches max_file_bytes.
+    """
+
+    def __init__(self, s3_client, s3_bucket, table_prefix, partition_columns, file_tag, stats,
+                 parquet_options=None, max_file_bytes=MAX_FILE_BYTES,
+                 part_size=S3_PART_SIZE, upload_concurrency=S3_UPLOAD_CONCURRENCY):
+        parquet_options = parquet_options or DEFAULT_PARQUET_OPTIONS
+        self.s3_client = s3_client
+        self.s3_bucket = s3_bucket
+        self.table_prefix = table_prefix
+        self.partition_columns = partition_columns
+        self.file_tag = file_tag
+        self.stats = stats
+        # Without a target, every partition slice of every input row group would become its own tiny row group
+        self.row_group_size = parquet_options.get('row_group_size') or HIVE_ROW_GROUP_SIZE
+        self.writer_options = {key: parquet_options[key] for key in PARQUET_WRITER_OPTIONS if key in parquet_options}
+        self.max_file_bytes = max_file_bytes
+        self.transfer_config = TransferConfig(multipart_chunksize=part_size, max_concurrency=upload_concurrency)
+        self.open_files = {}
+        self.file_counts = {}
+        self.written_keys = []
+        self.written_sizes = {}
+
+    def _partition_folder(self, values):
+        parts = []
+        for column, value in zip(self.partition_columns, values):
+            parts.append(f"{column}={HIVE_NULL_PARTITION if value is None else value}")
+        return '/'.join(parts)
+
+    def _open(self, folder, schema):
+        fd, path = tempfile.mkstemp(suffix='.parquet')
+        os.close(fd)
+        writer = RowGroupWriter(path, schema, self.row_group_size, **self.writer_options)
+        self.open_files[folder] = (path, writer)
+
+    def _upload(self, folder):
+        path, writer = self.open_files.pop(folder)
+        writer.close()
+        index = self.file_counts.get(folder, 0)
+        self.file_counts[folder] = index + 1
+        
+        s3_key = f"{self.table_prefix}/{folder}/{self.file_tag}-{index:05d}.parquet"
+        started = time.monotonic()
+        self.s3_client.upload_file(path, self.s3_bucket, s3_key, Config=self.transfer_config)
+        self.stats.record('upload', os.path.getsize(path), started, time.monotonic())
+        self.written_keys.append(s3_key)
+        self.written_sizes[s3_key] = os.path.getsize(path)
+        os.remove(path)
+
+    def write(self, table):
+        # One slice per distinct combination of partition values in this batch
+        keys = table.select(self.partition_columns).group_by(self.partition_columns).aggregate([])
+        for values in zip(*(keys.column(column).to_pylist() for column in self.partition_columns)):
+            mask = None
+            for column, value in zip(self.partition_columns, values):
+                condition = pc.is_null(table[column]) if value is None else pc.equal(table[column], value)
+                mask = condition if mask is None else pc.and_(mask, condition)
+            
+            folder = self._partition_folder(values)
+            if folder not in self.open_files:
+                self._open(folder, table.schema)
+            path, writer = self.open_files[folder]
+            writer.write(table.filter(mask))
+            
+            if os.path.getsize(path) >= self.max_file_bytes:
+                self._upload(folder)
+        
+        # Rows waiting to fill a row group are held in memory per partition; cap the total
+        if self.row_group_size:
+            buffered = {folder: writer.pending_rows for folder, (_, writer) in self.open_files.items()}
+            while buffered and sum(buffered.values()) > 2 * self.row_group_size:
+                largest = max(buffered, key=buffered.get)
+                self.open_files[largest][1].flush()
+                buffered[largest] = 0
+
+    def close(self):
+        for folder in list(self.open_files):
+            self._upload(folder)
+
+    def abort(self):
+        for path, writer in self.open_files.values():
+            writer.close()
+            os.remove(path)
+        self.open_files = {}
+
+
+def upload_row_groups_partitioned(row_groups, s3_client, s3_bucket, table_prefix, partition_columns, file_tag,
+                                  stats, parquet_options=None, max_file_bytes=MAX_FILE_BYTES):
+    """
+    Writes Arrow tables into key=value/ folders under table_prefix, checks every uploaded
+    file's size, then removes stale files: earlier files of this file_tag that weren't
+    rewritten, and the old single-file export.
+    Returns (row count, HivePartitionedWriter).
+    """
+    writer = HivePartitionedWriter(
+        s3_client, s3_bucket, table_prefix, partition_columns, file_tag, stats,
+        parquet_options=parquet_options, max_file_bytes=max_file_bytes
+    )
+    total_rows = 0
+    try:
+        for row_group in row_groups:
+            writer.write(row_group)
+            total_rows += row_group.num_rows
+        writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    
+    verify_s3_objects(s3_client, s3_bucket, writer.written_sizes)
+    
+    table_name = table_prefix.rstrip('/').split('/')[-1]
+    written = set(writer.written_keys)
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=s3_bucket, Prefix=f"{table_prefix}/"):
+        for obj in page.get('Contents', []):
+            key = obj['Key']
+            file_name = key.split('/')[-1]
+            stale_part = file_name.startswith(f"{file_tag}-") and '=' in key and key not in written
+            if stale_part or key == f"{table_prefix}/{table_name}.parquet":
+                s3_client.delete_object(Bucket=s3_bucket, Key=key)
+    
+    return total_rows, writer
+
+
+def merge_and_upload_partitioned(gcs_bucket, gcs_prefix, s3_bucket, table_prefix, partition_columns, aws_region,
+                                 file_tag='part', parquet_options=None, max_file_bytes=MAX_FILE_BYTES):
+    """
+    Merges GCS shards into a Hive-partitioned layout under table_prefix
+    (e.g. gold/fact_ratings/rating_year=2015/rating_month=3/part-00000.parquet)
+    with files capped at max_file_bytes. Files this export previously wrote under
+    the same file_tag but did not rewrite, and the old single-file export, are removed.
+    Returns the transfer's metrics (see transfer_metrics).
+    """
+    started = time.monotonic()
+    gcs_client = storage.Client()
+    s3_client = boto3.client('s3', region_name=aws_region)
+    
+    blobs = list_shard_blobs(gcs_client, gcs_bucket, gcs_prefix)
+    if len(blobs) == 0:
+        print(f"⚠️  No Parquet files found for {gcs_prefix}")
+        return None
+    
+    print(f"   Found {len(blobs)} file(s) in GCS, partitioning by {', '.join(partition_columns)}")
+    
+    stats = TransferStats()
+    row_groups = (row_group for _, row_group in iter_shard_row_groups(blobs, stats))
+    total_rows, writer = upload_row_groups_partitioned(
+        row_groups, s3_client, s3_bucket, table_prefix, partition_columns, file_tag, stats,
+        parquet_options, max_file_bytes
+    )
+    
+    metrics = transfer_metrics(stats, started, total_rows, len(blobs))
+    print(f"   Merged {len(blobs)} file(s) → {total_rows:,} rows in {len(writer.written_keys)} file(s) "
+          f"across {len(writer.file_counts)} partition(s)")
+    print_transfer_stats(metrics['transfer'])
+    print(f"✅ Uploaded to S3: s3://{s3_bucket}/{table_prefix}/")
+    
+    return metrics
+
+
+def iter_storage_api_batches(project_id, dataset_id, table_id, stats, max_streams=STORAGE_READ_STREAMS):
+    """
+    Yields Arrow tables read from BigQuery with the Storage Read API.
+    Each stream is read by its own thread; a bounded queue keeps memory at
+    STORAGE_QUEUE_BATCHES record batches. Row order across streams is not preserved.
+    """
+    # Optional dependency, only needed for the Storage Read API mode
+    from google.cloud import bigquery_storage
+    
+    read_client = bigquery_storage.BigQueryReadClient()
+    read_session = bigquery_storage.types.ReadSession(
+        table=f"projects/{project_id}/datasets/{dataset_id}/tables/{table_id}",
+        data_format=bigquery_storage.types.DataFormat.ARROW
+    )
+    session = read_client.create_read_session(
+        parent=f"projects/{project_id}",
+        read_session=read_session,
+        max_stream_count=max_streams
+    )
+    if not session.streams:
+        # Empty table: one empty batch so the writer still produces a valid file
+        yield pa.ipc.read_schema(pa.py_buffer(session.arrow_schema.serialized_schema)).empty_table()
         return
     
-    # Merge all tables
-    merged_table = pa.concat_tables(tables)
-    print(f"   Merged {len(tables)} file(s) → {merged_table.num_rows:,} rows")
+    print(f"   Reading {table_id} over {len(session.streams)} stream(s)")
+    batches = queue.Queue(maxsize=STORAGE_QUEUE_BATCHES)
+    stop = threading.Event()
+    done_marker = object()
     
-    # Write to S3 as single file
-    buffer = BytesIO()
-    pq.write_table(merged_table, buffer, compression='snappy')
-    buffer.seek(0)
+    def read_stream(stream_name):
+        try:
+            reader = read_client.read_rows(stream_name)
+            for page in reader.rows(session).pages:
+                if stop.is_set():
+                    return
+                started = time.monotonic()
+                batch = page.to_arrow()
+                stats.record('download', batch.nbytes, started, time.monotonic())
+                batches.put(pa.Table.from_batches([batch]))
+        except Exception as e:
+            batches.put(e)
+        finally:
+            batches.put(done_marker)
     
-    s3_client.upload_fileobj(buffer, s3_bucket, s3_key)
-    print(f"✅ Uploaded to S3: s3://{s3_bucket}/{s3_key}")
+    threads = [threading.Thread(target=read_stream, args=(stream.name,), daemon=True) for stream in session.streams]
+    for thread in threads:
+        thread.start()
+    
+    try:
+        remaining = len(threads)
+        while remaining:
+            item = batches.get()
+            if item is done_marker:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        # Unblock readers waiting on a full queue if the consumer stopped early
+        stop.set()
+        while any(thread.is_alive() for thread in threads):
+            try:
+                batches.get_nowait()
+            except queue.Empty:
+                time.sleep(0.1)
 
 
-def process_dataset(project_id, dataset_id, gcs_bucket, s3_bucket, s3_prefix, aws_region):
-    """Export all tables from BigQuery to S3 with separate folders for each table"""
-    bq_client = bigquery.Client(project=project_id)
+def export_table_via_storage_api(project_id, dataset_id, table_id, s3_bucket, s3_prefix, aws_region,
+                                 hive_partitioned=False, max_streams=STORAGE_READ_STREAMS):
+    """
+    Exports a table straight from BigQuery to S3 Parquet with the Storage Read API,
+    skipping the GCS extract and shard files. Meant for small and medium tables.
+    Returns the transfer's metrics (see transfer_metrics); read_bytes counts Arrow data read.
+    """
+    started = time.monotonic()
+    s3_client = boto3.client('s3', region_name=aws_region)
+    parquet_options = parquet_options_for(table_id)
+    if not parquet_options.get('row_group_size'):
+        # Read pages are small; without a target each one would become its own row group
+        parquet_options = dict(parquet_options, row_group_size=STORAGE_ROW_GROUP_SIZE)
+    stats = TransferStats()
+    row_groups = iter_storage_api_batches(project_id, dataset_id, table_id, stats, max_streams)
     
-    dataset_ref = f"{project_id}.{dataset_id}"
-    tables = bq_client.list_tables(dataset_ref)
+    if hive_partitioned and table_id in TABLE_PARTITION_COLUMNS:
+        table_prefix = f"{s3_prefix}/{table_id}"
+        total_rows, _ = upload_row_groups_partitioned(
+            row_groups, s3_client, s3_bucket, table_prefix, TABLE_PARTITION_COLUMNS[table_id], 'part',
+            stats, parquet_options
+        )
+        destination = f"s3://{s3_bucket}/{table_prefix}/"
+    else:
+        s3_key = f"{s3_prefix}/{table_id}/{table_id}.parquet"
+        total_rows = upload_row_groups(row_groups, s3_client, s3_bucket, s3_key, stats, parquet_options)
+        destination = f"s3://{s3_bucket}/{s3_key}"
+    
+    metrics = transfer_metrics(stats, started, total_rows, source='storage_api')
+    print(f"   Read {total_rows:,} rows via Storage Read API")
+    print_transfer_stats(metrics['transfer'])
+    print(f"✅ Uploaded to S3: {destination}")
+    
+    return metrics
+
+
+def transfer_table(table_id, gcs_bucket, gcs_prefix, s3_bucket, s3_prefix, aws_region, partition_id=None,
+                   hive_partitioned=False, keep_staging=False, transfer_state=None):
+    """
+    Merges a table's (or one partition's) GCS shards into the table's own S3 folder,
+    then deletes the shards unless keep_staging. Failed transfers leave them in place,
+    and with transfer_state a single-file upload is left open to be resumed.
+    Returns the transfer's metrics, or None if no shards were found.
+    With hive_partitioned, tables listed in TABLE_PARTITION_COLUMNS are written as key=value/ folders.
+    """
+    if hive_partitioned and table_id in TABLE_PARTITION_COLUMNS:
+        transfer = merge_and_upload_partitioned(
+            gcs_bucket,
+            gcs_prefix,
+            s3_bucket,
+            f"{s3_prefix}/{table_id}",
+            TABLE_PARTITION_COLUMNS[table_id],
+            aws_region,
+            file_tag=partition_id or 'part',
+            parquet_options=parquet_options_for(table_id)
+        )
     
-    table_count = 0
+    else:
+        file_name = f"{table_id}_{partition_id}" if partition_id else table_id
+        s3_key = f"{s3_prefix}/{table_id}/{file_name}.parquet"
+        transfer = merge_and_upload_to_s3(
+            gcs_bucket, 
+            gcs_prefix, 
+            s3_bucket, 
+            s3_key,
+            aws_region,
+            parquet_options=parquet_options_for(table_id),
+            transfer_state=transfer_state,
+            unit_name=_unit_name(table_id, partition_id)
+        )
+    
+    if not keep_staging:
+        delete_staging_shards(storage.Client(), gcs_bucket, gcs_prefix)
+    if transfer_state is not None:
+        transfer_state.discard(_unit_name(table_id, partition_id))
+    return transfer
+
+
+def list_exportable_tables(bq_client, dataset_ref):
+    """Returns the non-VIEW tables of a dataset and the number of views skipped"""
+    exportable = []
     view_count = 0
     
-    for table in tables:
+    for table in bq_client.list_tables(dataset_ref):
         full_table = bq_client.get_table(f"{dataset_ref}.{table.table_id}")
         
         if full_table.table_type == "VIEW":
@@ -113,28 +987,396 @@ def process_dataset(project_id, dataset_id, gcs_bucket, s3_bucket, s3_prefix, aw
             view_count += 1
             continue
         
-        print(f"\n📦 Processing: {table.table_id}")
+        exportable.append(full_table)
+    
+    return exportable, view_count
+
+
+def load_export_state(state_path=EXPORT_STATE_PATH):
+    """Reads the per-table export state written by the last successful runs"""
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_export_state(state, state_path=EXPORT_STATE_PATH):
+    """Writes the per-table export state"""
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+
+class TransferState:
+    """
+    Thread-safe JSON record of unfinished unit transfers, keyed by unit name:
+    the fingerprint the shards were extracted at, their staging prefix, each shard's
+    size and CRC32C, and the open multipart upload. Saved after every change.
+    """
+
+    def __init__(self, path=TRANSFER_STATE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.units = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.units = json.load(f)
+
+    def get(self, name):
+        with self.lock:
+            return copy.deepcopy(self.units.get(name, {}))
+
+    def update(self, name, **fields):
+        with self.lock:
+            self.units.setdefault(name, {}).update(fields)
+            self._save()
+
+    def discard(self, name):
+        with self.lock:
+            if self.units.pop(name, None) is not None:
+                self._save()
+
+    def _save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.units, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+
+def record_staged_shards(gcs_client, transfer_state, name, gcs_bucket, gcs_prefix, fingerprint):
+    """Stores a finished extract's shard checksums so a later run can skip the extract"""
+    shards = {
+        blob.name: {'size': blob.size, 'crc32c': blob.crc32c}
+        for blob in list_shard_blobs(gcs_client, gcs_bucket, gcs_prefix)
+    }
+    transfer_state.update(name, fingerprint=fingerprint, gcs_prefix=gcs_prefix, shards=shards)
+
+
+def resumable_staging(gcs_client, transfer_state, name, gcs_bucket, fingerprint):
+    """
+    Staging prefix of an earlier extract of this unit if its data hasn't changed since
+    and every recorded shard is still in GCS with the same CRC32C; None otherwise
+    """
+    unit = transfer_state.get(name)
+    if not unit.get('shards') or unit.get('fingerprint') != fingerprint:
+        return None
+    
+    staged = {
+        blob.name: blob.crc32c for blob in list_shard_blobs(gcs_client, gcs_bucket, unit['gcs_prefix'])
+    }
+    if staged != {shard: meta['crc32c'] for shard, meta in unit['shards'].items()}:
+        print(f"   ℹ️ Staged shards of {name} changed or expired, extracting again")
+        return None
+    return unit['gcs_prefix']
+
+
+def _unit_fingerprint(snapshots, table_id, partition_id):
+    snapshot = snapshots[table_id]
+    if partition_id:
+        return snapshot['partitions'][partition_id]
+    return snapshot['fingerprint']
+
+
+def table_fingerprint(full_table):
+    """Metadata that changes whenever a table's data changes"""
+    return {
+        'modified': full_table.modified.isoformat() if full_table.modified else None,
+        'num_rows': full_table.num_rows,
+        'num_bytes': full_table.num_bytes
+    }
+
+
+def partition_fingerprints(bq_client, project_id, dataset_id, table_id):
+    """Last-modified time and row count of every partition, from INFORMATION_SCHEMA.PARTITIONS"""
+    query = f"""
+    SELECT partition_id, last_modified_time, total_rows
+    FROM `{project_id}.{dataset_id}.INFORMATION_SCHEMA.PARTITIONS`
+    WHERE table_name = @table_id
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("table_id", "STRING", table_id)]
+    )
+    rows = bq_client.query(query, job_config=job_config, location=LOCATION).result()
+    return {
+        row.partition_id: {
+            'last_modified': row.last_modified_time.isoformat(),
+            'total_rows': row.total_rows
+        }
+        for row in rows
+    }
+
+
+def plan_exports(bq_client, project_id, dataset_id, tables, state, incremental, incremental_partitions):
+    """
+    Decides what to export. Returns (units, snapshots, skipped) where each unit is
+    (table_id, partition_id or None) and snapshots hold the metadata to record on success.
+    """
+    units = []
+    snapshots = {}
+    skipped = []
+    
+    for full_table in tables:
+        table_id = full_table.table_id
+        fingerprint = table_fingerprint(full_table)
+        previous = state.get(table_id, {})
         
-        # Step 1: Export to GCS (may create multiple files)
-        gcs_prefix = export_table_to_gcs_sharded(
-            project_id, dataset_id, table.table_id, gcs_bucket
-        )
+        if incremental and previous.get('fingerprint') == fingerprint:
+            print(f"⏭  Unchanged since last export: {table_id}")
+            skipped.append(table_id)
+            continue
         
-        # Step 2: Merge and upload to S3 in separate folder for each table
-        # Changed: Each table gets its own folder
-        s3_key = f"{s3_prefix}/{table.table_id}/{table.table_id}.parquet"
-        merge_and_upload_to_s3(
-            gcs_bucket, 
-            gcs_prefix, 
-            s3_bucket, 
-            s3_key,
-            aws_region
-        )
+        snapshot = {'fingerprint': fingerprint}
+        
+        if incremental_partitions and full_table.time_partitioning is not None:
+            # Only partitions added or modified since the last export
+            partitions = partition_fingerprints(bq_client, project_id, dataset_id, table_id)
+            previous_partitions = previous.get('partitions', {})
+            changed = [pid for pid, meta in sorted(partitions.items()) if previous_partitions.get(pid) != meta]
+            snapshot['partitions'] = partitions
+            units.extend((table_id, pid) for pid in changed)
+            print(f"🧩 {table_id}: {len(changed)} of {len(partitions)} partition(s) to export")
+        else:
+            units.append((table_id, None))
+        
+        snapshots[table_id] = snapshot
+    
+    return units, snapshots, skipped
+
+
+def _unit_name(table_id, partition_id):
+    return f"{table_id}${partition_id}" if partition_id else table_id
+
+
+def export_tables_pipelined(bq_client, project_id, dataset_id, units, gcs_bucket, s3_bucket, s3_prefix,
+                            aws_region, max_transfers=MAX_TRANSFERS, poll_seconds=EXTRACT_POLL_SECONDS,
+                            hive_partitioned=False, storage_api_tables=(), run_id=None,
+                            transfer_state=None, snapshots=None, metrics=None):
+    """
+    Submits every extract job up front and starts each GCS → S3 transfer
+    as soon as its extract finishes, with at most max_transfers running at once.
+    Whole-table units in storage_api_tables skip the extract and go straight to the pool.
+    All extracts share the run_id staging prefix. With transfer_state (and the snapshots from
+    plan_exports), units whose shards are still staged from an earlier run skip the extract.
+    Each finished unit is reported to metrics (an ExportMetrics).
+    units are (table_id, partition_id or None); returns {unit name: error message} for failures.
+    """
+    failed = {}
+    transfers = {}
+    run_id = run_id or new_run_id()
+    metrics = metrics or ExportMetrics(path=None)
+    extracts = {}
+    gcs_client = storage.Client()
+    executor = ThreadPoolExecutor(max_workers=max_transfers)
+    
+    # A failing unit is recorded and skipped, so one bad table never stops the others
+    def record_failure(name, error, stage):
+        failed[name] = error
+        metrics.emit(name, status='failed', error=error, **extracts.get(name, {}))
+        print(f"❌ {stage} failed: {name}: {error}")
+    
+    with executor:
+        # Step 1: Submit all extract jobs; BigQuery runs them concurrently
+        pending = {}
+        for table_id, partition_id in units:
+            name = _unit_name(table_id, partition_id)
+            try:
+                if partition_id is None and table_id in storage_api_tables:
+                    future = executor.submit(
+                        export_table_via_storage_api, project_id, dataset_id, table_id, s3_bucket, s3_prefix,
+                        aws_region, hive_partitioned
+                    )
+                    transfers[future] = name
+                    print(f"📡 Storage Read API export queued: {table_id}")
+                    continue
+                
+                if transfer_state is not None:
+                    gcs_prefix = resumable_staging(
+                        gcs_client, transfer_state, name, gcs_bucket,
+                        _unit_fingerprint(snapshots, table_id, partition_id)
+                    )
+                    if gcs_prefix:
+                        future = executor.submit(
+                            transfer_table, table_id, gcs_bucket, gcs_prefix, s3_bucket, s3_prefix,
+                            aws_region, partition_id, hive_partitioned, transfer_state=transfer_state
+                        )
+                        transfers[future] = name
+                        extracts[name] = {'resumed': True}
+                        print(f"↩️  Resuming from staged shards: {name}")
+                        continue
+                
+                extract_job, gcs_prefix = start_table_export(
+                    project_id, dataset_id, table_id, gcs_bucket, bq_client, partition_id,
+                    parquet_options_for(table_id).get('sort_by'), run_id
+                )
+                pending[(table_id, partition_id)] = (extract_job, gcs_prefix)
+                print(f"📤 Extract submitted: {name}")
+            except Exception as e:
+                record_failure(name, str(e), 'Extract submission')
         
-        table_count += 1
+        # Step 2: Hand finished extracts to the transfer pool while the rest keep running
+        while pending:
+            for unit, (extract_job, gcs_prefix) in list(pending.items()):
+                name = _unit_name(*unit)
+                try:
+                    if not extract_job.done():
+                        continue
+                    del pending[unit]
+                    
+                    extracts[name] = {
+                        'extract_seconds': _job_seconds(extract_job),
+                        'bytes_billed': getattr(extract_job, 'total_bytes_billed', None)
+                    }
+                    if extract_job.error_result:
+                        record_failure(name, extract_job.error_result.get('message'), 'Extract')
+                        continue
+                    
+                    print(f"✔ Exported to GCS: {project_id}.{dataset_id}.{name}")
+                    table_id, partition_id = unit
+                    if transfer_state is not None:
+                        record_staged_shards(
+                            gcs_client, transfer_state, name, gcs_bucket, gcs_prefix,
+                            _unit_fingerprint(snapshots, table_id, partition_id)
+                        )
+                    future = executor.submit(
+                        transfer_table, table_id, gcs_bucket, gcs_prefix, s3_bucket, s3_prefix,
+                        aws_region, partition_id, hive_partitioned, transfer_state=transfer_state
+                    )
+                    transfers[future] = name
+                except Exception as e:
+                    pending.pop(unit, None)
+                    record_failure(name, str(e), 'Extract')
+            
+            if pending:
+                time.sleep(poll_seconds)
+        
+        for future in as_completed(transfers):
+            name = transfers[future]
+            try:
+                transfer = future.result()
+            except Exception as e:
+                record_failure(name, str(e), 'Transfer')
+            else:
+                metrics.emit(name, status='succeeded', **extracts.get(name, {}), **(transfer or {}))
+    
+    return failed
+
+
+def process_dataset(project_id, dataset_id, gcs_bucket, s3_bucket, s3_prefix, aws_region,
+                    pipelined=False, max_transfers=MAX_TRANSFERS, incremental=False,
+                    incremental_partitions=False, state_path=EXPORT_STATE_PATH, hive_partitioned=False,
+                    storage_api_max_bytes=None, resumable=False, transfer_state_path=TRANSFER_STATE_PATH,
+                    metrics=None):
+    """
+    Export all tables from BigQuery to S3 with separate folders for each table.
+    incremental skips tables whose modified time, row count and size match the last
+    successful export; incremental_partitions exports only new or changed partitions
+    of partitioned tables, one file per partition. hive_partitioned writes the tables in
+    TABLE_PARTITION_COLUMNS as key=value/ folders of size-capped files. Tables no larger than
+    storage_api_max_bytes (e.g. STORAGE_API_MAX_BYTES) are read with the Storage Read API
+    instead of going through GCS, unless they need a sorted export. resumable keeps per-unit
+    transfer state in transfer_state_path, so a rerun after a crash reuses staged shards that
+    still match their CRC32C and continues unfinished multipart uploads. Per-unit timings and
+    byte counts go to metrics (an ExportMetrics), if given.
+    """
+    bq_client = bigquery.Client(project=project_id)
+    
+    dataset_ref = f"{project_id}.{dataset_id}"
+    tables, view_count = list_exportable_tables(bq_client, dataset_ref)
     
-    print(f"\n🎉 Processed {table_count} tables")
+    state = load_export_state(state_path) if (incremental or incremental_partitions) else {}
+    units, snapshots, skipped = plan_exports(
+        bq_client, project_id, dataset_id, tables, state, incremental, incremental_partitions
+    )
+    
+    run_id = new_run_id()
+    print(f"🗂  Staging prefix: gs://{gcs_bucket}/{GCS_STAGING_ROOT}/{run_id}/")
+    transfer_state = TransferState(transfer_state_path) if resumable else None
+    metrics = metrics or ExportMetrics(path=None)
+    metrics.run_id = run_id
+    
+    storage_api_tables = set()
+    if storage_api_max_bytes:
+        storage_api_tables = {
+            table.table_id for table in tables
+            if (table.num_bytes or 0) <= storage_api_max_bytes and not parquet_options_for(table.table_id).get('sort_by')
+        }
+    
+    if pipelined:
+        failed = export_tables_pipelined(
+            bq_client, project_id, dataset_id, units, gcs_bucket, s3_bucket, s3_prefix,
+            aws_region, max_transfers, hive_partitioned=hive_partitioned, storage_api_tables=storage_api_tables,
+            run_id=run_id, transfer_state=transfer_state, snapshots=snapshots, metrics=metrics
+        )
+    else:
+        failed = {}
+        gcs_client = storage.Client()
+        for table_id, partition_id in units:
+            name = _unit_name(table_id, partition_id)
+            print(f"\n📦 Processing: {name}")
+            
+            # A failed unit is recorded and skipped, as in pipelined mode, so the rest still run
+            extract = {}
+            try:
+                if partition_id is None and table_id in storage_api_tables:
+                    transfer = export_table_via_storage_api(
+                        project_id, dataset_id, table_id, s3_bucket, s3_prefix, aws_region, hive_partitioned
+                    )
+                    metrics.emit(name, status='succeeded', **transfer)
+                    continue
+                
+                # Step 1: Export to GCS (may create multiple files), unless an earlier run already did
+                gcs_prefix = None
+                if transfer_state is not None:
+                    fingerprint = _unit_fingerprint(snapshots, table_id, partition_id)
+                    gcs_prefix = resumable_staging(gcs_client, transfer_state, name, gcs_bucket, fingerprint)
+                
+                if gcs_prefix:
+                    print(f"↩️  Resuming from staged shards: {name}")
+                    extract = {'resumed': True}
+                else:
+                    extract_job, gcs_prefix = start_table_export(
+                        project_id, dataset_id, table_id, gcs_bucket, bq_client, partition_id,
+                        parquet_options_for(table_id).get('sort_by'), run_id
+                    )
+                    extract_job.result()
+                    print(f"✔ Exported to GCS: {project_id}.{dataset_id}.{name}")
+                    extract = {
+                        'extract_seconds': _job_seconds(extract_job),
+                        'bytes_billed': getattr(extract_job, 'total_bytes_billed', None)
+                    }
+                    if transfer_state is not None:
+                        record_staged_shards(gcs_client, transfer_state, name, gcs_bucket, gcs_prefix, fingerprint)
+                
+                # Step 2: Merge and upload to S3 in separate folder for each table
+                transfer = transfer_table(
+                    table_id, gcs_bucket, gcs_prefix, s3_bucket, s3_prefix, aws_region, partition_id, hive_partitioned,
+                    transfer_state=transfer_state
+                )
+                metrics.emit(name, status='succeeded', **extract, **(transfer or {}))
+            except Exception as e:
+                failed[name] = str(e)
+                metrics.emit(name, status='failed', error=failed[name], **extract)
+                print(f"❌ Transfer failed: {name}: {e}")
+    
+    # Record tables whose every unit made it to S3
+    failed_tables = {name.split('$')[0] for name in failed}
+    exported_tables = [table_id for table_id in snapshots if table_id not in failed_tables]
+    if incremental or incremental_partitions:
+        s3_client = boto3.client('s3', region_name=aws_region)
+        for table_id in exported_tables:
+            # First per-partition export of a table: drop the old whole-table file so rows aren't duplicated
+            if 'partitions' in snapshots[table_id] and 'partitions' not in state.get(table_id, {}):
+                s3_client.delete_object(Bucket=s3_bucket, Key=f"{s3_prefix}/{table_id}/{table_id}.parquet")
+            state[table_id] = dict(snapshots[table_id], exported_at=datetime.utcnow().isoformat())
+        save_export_state(state, state_path)
+    
+    print(f"\n🎉 Processed {len(exported_tables)} tables")
     print(f"⊘ Skipped {view_count} views")
+    if skipped:
+        print(f"⏭  Skipped {len(skipped)} unchanged tables")
+    if failed:
+        print(f"❌ Failed {len(failed)} exports: {', '.join(sorted(failed))}")
+    
+    return failed
 
 
 def create_s3_bucket_if_not_exists(bucket_name, region):
@@ -157,12 +1399,44 @@ def create_s3_bucket_if_not_exists(bucket_name, region):
         except Exception as e:
             print(f"❌ Failed to create S3 bucket: {e}")
             raise
+    
+    ensure_multipart_lifecycle(s3_client, bucket_name)
+
+
+def ensure_multipart_lifecycle(s3_client, bucket_name, days=S3_ABORT_MULTIPART_DAYS):
+    """Adds a lifecycle rule aborting incomplete multipart uploads after `days`, as a backstop for uploads no run resumes"""
+    try:
+        rules = s3_client.get_bucket_lifecycle_configuration(Bucket=bucket_name)['Rules']
+    except s3_client.exceptions.ClientError as e:
+        if e.response['Error']['Code'] != 'NoSuchLifecycleConfiguration':
+            raise
+        rules = []
+    for rule in rules:
+        bucket_wide = not rule.get('Filter', {}).get('Prefix') and not rule.get('Prefix')
+        if rule.get('Status') == 'Enabled' and 'AbortIncompleteMultipartUpload' in rule and bucket_wide:
+            return
+    
+    # The put replaces the whole configuration, so existing rules are sent back with the new one
+    rules.append({
+        'ID': 'abort-incomplete-multipart-uploads',
+        'Filter': {'Prefix': ''},
+        'Status': 'Enabled',
+        'AbortIncompleteMultipartUpload': {'DaysAfterInitiation': days}
+    })
+    s3_client.put_bucket_lifecycle_configuration(Bucket=bucket_name, LifecycleConfiguration={'Rules': rules})
+    print(f"✅ Incomplete multipart uploads in s3://{bucket_name} are aborted after {days} day(s)")
 
 
 def main():
     create_gcs_bucket(GCS_BUCKET, LOCATION, PROJECT_ID)
     create_s3_bucket_if_not_exists(S3_BUCKET, AWS_REGION)
-    process_dataset(PROJECT_ID, DATASET_ID, GCS_BUCKET, S3_BUCKET, S3_PREFIX, AWS_REGION)
+    metrics = ExportMetrics(METRICS_PATH)
+    process_dataset(
+        PROJECT_ID, DATASET_ID, GCS_BUCKET, S3_BUCKET, S3_PREFIX, AWS_REGION,
+        pipelined=True, incremental=True, storage_api_max_bytes=STORAGE_API_MAX_BYTES, resumable=True,
+        metrics=metrics
+    )
+    metrics.print_summary()
 
 
 if __name__ == "__main__":
@@ -1,11 +1,284 @@
 import boto3
+import pyarrow as pa
 import pyarrow.parquet as pq
-from io import BytesIO
-from collections import defaultdict
+from botocore.config import Config
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import base64
+import decimal
 import json
-from datetime import datetime
+import threading
+from datetime import date, datetime, time
 import os
 
+FOOTER_PREFETCH_BYTES = 64 * 1024  # Tail fetched with the first ranged GET; covers most Parquet footers
+PARQUET_MAGIC = b'PAR1'
+HIVE_NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'  # Null partition folder; not covered by projection
+SCAN_WORKERS = 16  # Folders analyzed in parallel
+FOOTER_WORKERS = 4  # Footers read in parallel within each folder
+SCHEMA_CACHE_PATH = "schema_cache.json"  # Footer details per bucket/key, reused while the ETag is unchanged
+
+
+class S3SeekableFile:
+    """
+    Read-only, seekable file object over an S3 object, backed by ranged GETs.
+    On open it fetches the tail of the object (the last 8 bytes hold the footer
+    length and magic) and, if the footer is longer than that, the rest of the
+    metadata block. pq.ParquetFile then reads schema and row-group metadata from
+    that cache without downloading the file body.
+    """
+
+    def __init__(self, s3_client, bucket_name, key, prefetch_bytes=FOOTER_PREFETCH_BYTES):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.position = 0
+        self.closed = False
+        self.requests = 0
+        self.bytes_fetched = 0
+        
+        # Suffix range: the last prefetch_bytes, plus the object size from Content-Range
+        tail, self.size = self._get(f"bytes=-{prefetch_bytes}")
+        if len(tail) < 8 or tail[-4:] != PARQUET_MAGIC:
+            raise ValueError(f"s3://{bucket_name}/{key} is not a Parquet file")
+        
+        footer_length = int.from_bytes(tail[-8:-4], 'little')
+        if footer_length + 8 > len(tail):
+            head, _ = self._get(f"bytes={self.size - footer_length - 8}-{self.size - len(tail) - 1}")
+            tail = head + tail
+        
+        self.cache_start = self.size - len(tail)
+        self.cache = tail
+
+    def _get(self, byte_range):
+        response = self.s3_client.get_object(Bucket=self.bucket_name, Key=self.key, Range=byte_range)
+        data = response['Body'].read()
+        self.requests += 1
+        self.bytes_fetched += len(data)
+        return data, int(response['ContentRange'].split('/')[-1])
+
+    def read(self, size=-1):
+        end = self.size if size is None or size < 0 else min(self.position + size, self.size)
+        if end <= self.position:
+            return b''
+        
+        if self.position >= self.cache_start:
+            data = self.cache[self.position - self.cache_start:end - self.cache_start]
+        else:
+            data, _ = self._get(f"bytes={self.position}-{end - 1}")
+        self.position += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            self.position = offset
+        elif whence == 1:
+            self.position += offset
+        else:
+            self.position = self.size + offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return False
+
+    def close(self):
+        self.closed = True
+
+
+def open_parquet_footer(s3_client, bucket_name, key):
+    """ParquetFile for an S3 object, opened from its footer only (a few KB instead of the whole file)"""
+    return pq.ParquetFile(S3SeekableFile(s3_client, bucket_name, key))
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def _encode_value(value):
+    """JSON form of a Parquet statistics value that _decode_value turns back into the same type"""
+    if isinstance(value, bytes):
+        return {'bytes': _b64(value)}
+    if isinstance(value, datetime):
+        return {'datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'date': value.isoformat()}
+    if isinstance(value, time):
+        return {'time': value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {'decimal': str(value)}
+    return value
+
+
+def _decode_value(value):
+    if not isinstance(value, dict):
+        return value
+    (kind, text), = value.items()
+    if kind == 'bytes':
+        return base64.b64decode(text)
+    if kind == 'datetime':
+        return datetime.fromisoformat(text)
+    if kind == 'date':
+        return date.fromisoformat(text)
+    if kind == 'time':
+        return time.fromisoformat(text)
+    return decimal.Decimal(text)
+
+
+def _min_max(current, value, pick):
+    """min/max that gives up (None) on missing or mutually incomparable values"""
+    if current is None or value is None:
+        return None
+    try:
+        return pick(current, value)
+    except TypeError:
+        return None
+
+
+class SchemaCache:
+    """
+    On-disk cache of Parquet footer details (Arrow schema, row-group count,
+    key/value metadata, row count, per-column null counts and min/max) keyed by bucket/key.
+    An entry is used only while the object's ETag matches the one it was read at.
+    Thread-safe; call save() at the end.
+    """
+
+    def __init__(self, path=SCHEMA_CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def get(self, bucket_name, key, etag):
+        with self.lock:
+            entry = self.entries.get(f"{bucket_name}/{key}")
+            # Entries from before a field was added count as misses
+            if entry is None or entry['etag'] != etag or 'column_stats' not in entry:
+                self.misses += 1
+                return None
+            self.hits += 1
+        
+        return {
+            'schema': pa.ipc.read_schema(pa.py_buffer(base64.b64decode(entry['schema']))),
+            'num_row_groups': entry['num_row_groups'],
+            'metadata': {
+                base64.b64decode(name): base64.b64decode(value) for name, value in entry['metadata'].items()
+            },
+            'num_rows': entry['num_rows'],
+            'null_counts': entry['null_counts'],
+            'column_stats': {
+                name: {bound: _decode_value(value) for bound, value in stats.items()}
+                for name, stats in entry['column_stats'].items()
+            }
+        }
+
+    def put(self, bucket_name, key, etag, footer):
+        entry = {
+            'etag': etag,
+            'schema': _b64(footer['schema'].serialize().to_pybytes()),
+            'num_row_groups': footer['num_row_groups'],
+            'metadata': {_b64(name): _b64(value) for name, value in footer['metadata'].items()},
+            'num_rows': footer['num_rows'],
+            'null_counts': footer['null_counts'],
+            'column_stats': {
+                name: {bound: _encode_value(value) for bound, value in stats.items()}
+                for name, stats in footer['column_stats'].items()
+            }
+        }
+        with self.lock:
+            self.entries[f"{bucket_name}/{key}"] = entry
+            self.dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            self.dirty = False
+
+
+def column_null_counts(metadata):
+    """Null count per column summed over row-group statistics; None where a row group has no count"""
+    null_counts = {}
+    for rg in range(metadata.num_row_groups):
+        row_group = metadata.row_group(rg)
+        for i in range(row_group.num_columns):
+            column = row_group.column(i)
+            stats = column.statistics
+            count = stats.null_count if stats is not None and stats.has_null_count else None
+            name = column.path_in_schema
+            if rg == 0:
+                null_counts[name] = count
+            elif null_counts.get(name) is not None:
+                null_counts[name] = None if count is None else null_counts[name] + count
+    return null_counts
+
+
+def column_min_max(metadata):
+    """Min and max per column over row-group statistics; None where a row group has no min/max"""
+    column_stats = {}
+    for rg in range(metadata.num_row_groups):
+        row_group = metadata.row_group(rg)
+        for i in range(row_group.num_columns):
+            column = row_group.column(i)
+            stats = column.statistics
+            has_min_max = stats is not None and stats.has_min_max
+            low, high = (stats.min, stats.max) if has_min_max else (None, None)
+            name = column.path_in_schema
+            if rg == 0:
+                column_stats[name] = {'min': low, 'max': high}
+            else:
+                current = column_stats[name]
+                current['min'] = _min_max(current['min'], low, min)
+                current['max'] = _min_max(current['max'], high, max)
+    return column_stats
+
+
+def read_footer(s3_client, bucket_name, key, etag=None, cache=None):
+    """
+    Schema, row-group count, key/value metadata, row count, null counts and
+    min/max of an S3 Parquet file, from the cache when the ETag is unchanged,
+    otherwise from a footer-only read
+    """
+    if cache is not None and etag:
+        footer = cache.get(bucket_name, key, etag)
+        if footer is not None:
+            return footer
+    
+    parquet_file = open_parquet_footer(s3_client, bucket_name, key)
+    footer = {
+        'schema': parquet_file.schema_arrow,
+        'num_row_groups': parquet_file.num_row_groups,
+        'metadata': parquet_file.metadata.metadata or {},
+        'num_rows': parquet_file.metadata.num_rows,
+        'null_counts': column_null_counts(parquet_file.metadata),
+        'column_stats': column_min_max(parquet_file.metadata)
+    }
+    if cache is not None and etag:
+        cache.put(bucket_name, key, etag, footer)
+    return footer
+
+
+def create_s3_client(max_workers=SCAN_WORKERS, footer_workers=FOOTER_WORKERS):
+    """One S3 client shared by all scan threads, with a connection pool sized for them"""
+    # Each folder thread waits on at most footer_workers footer reads at a time
+    return boto3.client('s3', config=Config(max_pool_connections=max(10, max_workers * footer_workers + 1)))
+
+
 def get_folders_in_prefix(s3_client, bucket_name, prefix):
     """Get all unique folder paths under a prefix."""
     folders = set()
@@ -21,9 +294,9 @@ def get_folders_in_prefix(s3_client, bucket_name, prefix):
     return sorted(folders)
 
 
-def get_parquet_files_in_folder(s3_client, bucket_name, folder_prefix):
-    """Get all parquet files in a specific folder."""
-    parquet_files = []
+def get_parquet_objects_in_folder(s3_client, bucket_name, folder_prefix):
+    """Get the listing entries (Key, ETag, Size, ...) of all parquet files in a specific folder."""
+    parquet_objects = []
     paginator = s3_client.get_paginator('list_objects_v2')
     pages = paginator.paginate(Bucket=bucket_name, Prefix=folder_prefix)
     
@@ -31,95 +304,320 @@ def get_parquet_files_in_folder(s3_client, bucket_name, folder_prefix):
         if 'Contents' in page:
             for obj in page['Contents']:
                 if obj['Key'].endswith('.parquet'):
-                    parquet_files.append(obj['Key'])
+                    parquet_objects.append(obj)
     
-    return parquet_files
+    return parquet_objects
+
+
+def get_parquet_files_in_folder(s3_client, bucket_name, folder_prefix):
+    """Get all parquet files in a specific folder."""
+    return [obj['Key'] for obj in get_parquet_objects_in_folder(s3_client, bucket_name, folder_prefix)]
 
 
-def analyze_folder_schemas(bucket_name, folder_prefix):
-    """Analyze all parquet schemas in a single folder."""
-    s3_client = boto3.client('s3')
+def analyze_folder_schemas(bucket_name, folder_prefix, s3_client=None, file_workers=FOOTER_WORKERS, log=print,
+                           cache=None):
+    """
+    Analyze all parquet schemas in a single folder.
+    Sample files are checked by up to file_workers threads; output goes through log.
+    With a SchemaCache, files whose ETag hasn't changed are not read at all.
+    """
+    s3_client = s3_client or create_s3_client(1, file_workers)
     schemas = {}
     schema_summary = defaultdict(set)
     
-    print(f"\n{'='*80}")
-    print(f"Analyzing Folder: {folder_prefix}")
-    print(f"{'='*80}")
+    log(f"\n{'='*80}")
+    log(f"Analyzing Folder: {folder_prefix}")
+    log(f"{'='*80}")
     
-    parquet_files = get_parquet_files_in_folder(s3_client, bucket_name, folder_prefix)
+    parquet_objects = get_parquet_objects_in_folder(s3_client, bucket_name, folder_prefix)
+    parquet_files = [obj['Key'] for obj in parquet_objects]
+    etags = {obj['Key']: obj['ETag'] for obj in parquet_objects}
     
     if not parquet_files:
-        print(f"⚠️  No Parquet files found in {folder_prefix}")
+        log(f"⚠️  No Parquet files found in {folder_prefix}")
         return None, None
     
-    print(f"Found {len(parquet_files)} Parquet file(s)")
+    log(f"Found {len(parquet_files)} Parquet file(s)")
     
     # Sample first file for schema
     sample_file = parquet_files[0]
-    print(f"\nSampling schema from: {sample_file}")
-    print("-" * 80)
+    log(f"\nSampling schema from: {sample_file}")
+    log("-" * 80)
     
     try:
-        # Download file to memory
-        obj = s3_client.get_object(Bucket=bucket_name, Key=sample_file)
-        parquet_bytes = obj['Body'].read()
-        
-        # Read Parquet schema
-        parquet_file = pq.ParquetFile(BytesIO(parquet_bytes))
-        schema = parquet_file.schema_arrow
+        # Read Parquet schema from the footer
+        footer = read_footer(s3_client, bucket_name, sample_file, etags[sample_file], cache)
+        schema = footer['schema']
         
         schemas[sample_file] = schema
         
         # Print schema details
-        print(f"Columns: {len(schema)}")
-        print(f"Row Groups: {parquet_file.num_row_groups}")
-        print(f"\nSchema:")
+        log(f"Columns: {len(schema)}")
+        log(f"Row Groups: {footer['num_row_groups']}")
+        log(f"\nSchema:")
         
         for i in range(len(schema)):
             field = schema.field(i)
-            print(f"  {i+1}. {field.name:30} {str(field.type):20} (nullable={field.nullable})")
+            log(f"  {i+1}. {field.name:30} {str(field.type):20} (nullable={field.nullable})")
             schema_summary[field.name].add(str(field.type))
         
         # Show metadata if available
-        if parquet_file.metadata.metadata:
-            print(f"\nMetadata:")
-            for key, value in parquet_file.metadata.metadata.items():
-                print(f"  {key.decode()}: {value.decode()}")
+        if footer['metadata']:
+            log(f"\nMetadata:")
+            for key, value in footer['metadata'].items():
+                log(f"  {key.decode()}: {value.decode()}")
         
         # Verify consistency with other files (sample a few more if many files exist)
         files_to_check = parquet_files[1:min(5, len(parquet_files))]
         if files_to_check:
-            print(f"\nVerifying schema consistency across {len(files_to_check)} additional file(s)...")
-            for file_key in files_to_check:
+            log(f"\nVerifying schema consistency across {len(files_to_check)} additional file(s)...")
+            
+            def read_schema(file_key):
                 try:
-                    obj = s3_client.get_object(Bucket=bucket_name, Key=file_key)
-                    pf = pq.ParquetFile(BytesIO(obj['Body'].read()))
-                    file_schema = pf.schema_arrow
-                    
-                    for i in range(len(file_schema)):
-                        field = file_schema.field(i)
-                        schema_summary[field.name].add(str(field.type))
+                    return read_footer(s3_client, bucket_name, file_key, etags[file_key], cache)['schema']
                 except Exception as e:
-                    print(f"  ⚠️  Error checking {file_key}: {str(e)}")
+                    log(f"  ⚠️  Error checking {file_key}: {str(e)}")
+                    return None
+            
+            with ThreadPoolExecutor(max_workers=max(1, file_workers)) as executor:
+                file_schemas = list(executor.map(read_schema, files_to_check))
+            
+            for file_schema in file_schemas:
+                if file_schema is None:
+                    continue
+                for i in range(len(file_schema)):
+                    field = file_schema.field(i)
+                    schema_summary[field.name].add(str(field.type))
         
         # Check for inconsistencies
         inconsistent_columns = [(col, types) for col, types in schema_summary.items() if len(types) > 1]
         if inconsistent_columns:
-            print(f"\n⚠️  WARNING: Inconsistent schemas detected!")
+            log(f"\n⚠️  WARNING: Inconsistent schemas detected!")
             for col_name, types in inconsistent_columns:
-                print(f"  Column '{col_name}' has different types: {', '.join(types)}")
+                log(f"  Column '{col_name}' has different types: {', '.join(types)}")
         else:
-            print(f"\n✅ Schema is consistent across sampled files")
+            log(f"\n✅ Schema is consistent across sampled files")
         
         return schema, schema_summary
         
     except Exception as e:
-        print(f"ERROR reading file: {str(e)}")
+        log(f"ERROR reading file: {str(e)}")
         return None, None
 
 
-def generate_athena_ddl(schema, bucket_name, folder_prefix, table_name):
-    """Generate Athena CREATE EXTERNAL TABLE statement from Parquet schema."""
+def read_folder_footers(s3_client, bucket_name, folder_prefix, max_workers=FOOTER_WORKERS, cache=None):
+    """
+    Reads the footer of every Parquet file in a folder in parallel (no file bodies).
+    Returns a list of (listing entry, footer or None, error or None).
+    """
+    parquet_objects = get_parquet_objects_in_folder(s3_client, bucket_name, folder_prefix)
+    
+    def read_one(obj):
+        try:
+            return obj, read_footer(s3_client, bucket_name, obj['Key'], obj['ETag'], cache), None
+        except Exception as e:
+            return obj, None, str(e)
+    
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        return list(executor.map(read_one, parquet_objects))
+
+
+def detect_schema_drift(s3_client, bucket_name, folder_prefix, max_workers=FOOTER_WORKERS, cache=None,
+                        folder_footers=None):
+    """
+    Reads the footer of every Parquet file in a folder (in parallel, no file bodies)
+    and compares each file's schema to the folder's most common one.
+    Returns a report with per-column type sets, row and null counts from footer
+    statistics, and the exact files that diverge. folder_footers reuses the result
+    of read_folder_footers.
+    """
+    if folder_footers is None:
+        folder_footers = read_folder_footers(s3_client, bucket_name, folder_prefix, max_workers, cache)
+    
+    footers = {obj['Key']: footer for obj, footer, error in folder_footers if footer is not None}
+    file_schemas = {
+        key: tuple((field.name, str(field.type)) for field in footer['schema'])
+        for key, footer in footers.items()
+    }
+    
+    report = {
+        'folder_prefix': folder_prefix,
+        'files': len(folder_footers),
+        'rows': sum(footer['num_rows'] for footer in footers.values()),
+        'unreadable': [{'key': obj['Key'], 'error': error} for obj, footer, error in folder_footers if error],
+        'reference_schema': [],
+        'reference_files': 0,
+        'columns': {},
+        'diverging_files': []
+    }
+    if not footers:
+        return report
+    
+    reference, reference_files = Counter(file_schemas.values()).most_common(1)[0]
+    report['reference_schema'] = [list(column) for column in reference]
+    report['reference_files'] = reference_files
+    
+    # Per-column type sets (files per type), presence and null counts
+    columns = report['columns']
+    for key, footer in footers.items():
+        for name, type_name in file_schemas[key]:
+            column = columns.setdefault(name, {'types': {}, 'files': 0, 'null_count': 0})
+            column['types'][type_name] = column['types'].get(type_name, 0) + 1
+            column['files'] += 1
+            null_count = footer['null_counts'].get(name)
+            if column['null_count'] is not None:
+                column['null_count'] = None if null_count is None else column['null_count'] + null_count
+    
+    expected = dict(reference)
+    for key in sorted(footers):
+        if file_schemas[key] == reference:
+            continue
+        found = dict(file_schemas[key])
+        report['diverging_files'].append({
+            'key': key,
+            'num_rows': footers[key]['num_rows'],
+            'missing_columns': [name for name in expected if name not in found],
+            'extra_columns': [name for name in found if name not in expected],
+            'type_changes': [
+                {'column': name, 'expected': expected[name], 'found': found[name]}
+                for name in expected if name in found and found[name] != expected[name]
+            ],
+            'reordered': found == expected
+        })
+    
+    return report
+
+
+def print_drift_report(report, log=print):
+    """Human-readable summary of a detect_schema_drift report"""
+    log(f"\nFull drift scan: {report['files']} file(s), {report['rows']:,} rows")
+    for item in report['unreadable']:
+        log(f"  ⚠️  Could not read footer of {item['key']}: {item['error']}")
+    
+    for name, column in report['columns'].items():
+        if len(column['types']) > 1:
+            types = ', '.join(f"{type_name} ({files} file(s))" for type_name, files in column['types'].items())
+            log(f"  Column '{name}' has different types: {types}")
+    
+    if not report['diverging_files']:
+        log(f"✅ All {report['reference_files']} readable file(s) share one schema")
+        return
+    
+    log(f"⚠️  {len(report['diverging_files'])} file(s) diverge from the schema of "
+        f"{report['reference_files']} file(s):")
+    for item in report['diverging_files']:
+        details = []
+        if item['missing_columns']:
+            details.append(f"missing {', '.join(item['missing_columns'])}")
+        if item['extra_columns']:
+            details.append(f"extra {', '.join(item['extra_columns'])}")
+        for change in item['type_changes']:
+            details.append(f"{change['column']}: {change['found']} (expected {change['expected']})")
+        if item['reordered']:
+            details.append("columns in a different order")
+        log(f"  - {item['key']}: {'; '.join(details)}")
+
+
+def profile_folder(s3_client, bucket_name, folder_prefix, max_workers=FOOTER_WORKERS, cache=None,
+                   folder_footers=None):
+    """
+    Table statistics for a folder from Parquet footers alone: file, row-group, row and
+    byte counts, and per column the null count and min/max over all row groups.
+    A column's null count or min/max is None when any file lacks those statistics.
+    """
+    if folder_footers is None:
+        folder_footers = read_folder_footers(s3_client, bucket_name, folder_prefix, max_workers, cache)
+    readable = [(obj, footer) for obj, footer, error in folder_footers if footer is not None]
+    
+    columns = {}
+    for obj, footer in readable:
+        # Schema order, so footers read back from the key-sorted cache list columns the same way
+        column_stats = footer['column_stats']
+        ordered = [name for name in footer['schema'].names if name in column_stats]
+        ordered += [name for name in column_stats if name not in ordered]
+        for name in ordered:
+            stats = column_stats[name]
+            null_count = footer['null_counts'].get(name)
+            if name not in columns:
+                columns[name] = {'null_count': null_count, 'min': stats['min'], 'max': stats['max'], 'files': 1}
+                continue
+            column = columns[name]
+            column['files'] += 1
+            if column['null_count'] is not None:
+                column['null_count'] = None if null_count is None else column['null_count'] + null_count
+            column['min'] = _min_max(column['min'], stats['min'], min)
+            column['max'] = _min_max(column['max'], stats['max'], max)
+    
+    rows = sum(footer['num_rows'] for _, footer in readable)
+    for column in columns.values():
+        # Files without the column say nothing about its nulls or range
+        if column['files'] < len(readable):
+            column['null_count'] = column['min'] = column['max'] = None
+        column['null_fraction'] = (
+            round(column['null_count'] / rows, 4) if column['null_count'] is not None and rows else None
+        )
+    
+    return {
+        'folder_prefix': folder_prefix,
+        'files': len(folder_footers),
+        'unreadable_files': len(folder_footers) - len(readable),
+        'row_groups': sum(footer['num_row_groups'] for _, footer in readable),
+        'rows': rows,
+        'bytes': sum(obj['Size'] for obj, _ in readable),
+        'columns': columns
+    }
+
+
+def _display_value(value):
+    """Statistics value as text for summaries and JSON"""
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def print_profile(profile, log=print):
+    """Human-readable summary of a profile_folder result"""
+    log(f"\nProfile: {profile['rows']:,} rows in {profile['files']} file(s), "
+        f"{profile['row_groups']} row group(s), {profile['bytes'] / 1024 / 1024:,.1f} MB")
+    for name, column in profile['columns'].items():
+        nulls = 'n/a' if column['null_count'] is None else f"{column['null_count']:,}"
+        log(f"  {name:30} nulls={nulls:>12}  min={_display_value(column['min'])}  max={_display_value(column['max'])}")
+
+
+def folder_partitions(parquet_keys, folder_prefix):
+    """
+    Detects a Hive layout (folder/col=value/.../file.parquet) from the object keys.
+    Returns {column: sorted set of values} in path order, or {} when the folder is not
+    partitioned the same way throughout.
+    """
+    partitions = None
+    for key in parquet_keys:
+        parts = key[len(folder_prefix):].lstrip('/').split('/')[:-1]
+        if not parts or not all('=' in part for part in parts):
+            return {}
+        pairs = [part.split('=', 1) for part in parts]
+        if partitions is None:
+            partitions = {name: set() for name, _ in pairs}
+        if [name for name, _ in pairs] != list(partitions):
+            return {}
+        for name, value in pairs:
+            if value != HIVE_NULL_PARTITION:
+                partitions[name].add(value)
+    return {name: sorted(values) for name, values in (partitions or {}).items()}
+
+
+def generate_athena_ddl(schema, bucket_name, folder_prefix, table_name, partitions=None):
+    """
+    Generate Athena CREATE EXTERNAL TABLE statement from Parquet schema.
+    partitions ({column: values}, see folder_partitions) adds PARTITIONED BY with
+    partition projection over the values seen, so no MSCK REPAIR is needed.
+    """
     
     # Map PyArrow types to Athena types
     type_mapping = {
@@ -150,14 +648,44 @@ def generate_athena_ddl(schema, bucket_name, folder_prefix, table_name):
         
         return 'STRING'
     
+    partitions = partitions or {}
+    
     # Build columns
     columns = []
+    table_columns = []
     for i in range(len(schema)):
         field = schema.field(i)
         athena_type = map_type(field.type)
         columns.append(f"  {field.name} {athena_type}")
+        if field.name not in partitions:
+            table_columns.append(f"  {field.name} {athena_type}")
     
     columns_str = ',\n'.join(columns)
+    table_columns_str = ',\n'.join(table_columns)
+    
+    # Partition columns come from the path; Athena rejects them in the column list too
+    partition_clause = ''
+    projection_properties = ''
+    if partitions:
+        partition_columns = []
+        projection = ["  'projection.enabled'='true'"]
+        for name, values in partitions.items():
+            if name in schema.names:
+                athena_type = map_type(schema.field(name).type)
+            else:
+                athena_type = 'INT' if values and all(v.lstrip('-').isdigit() for v in values) else 'STRING'
+            partition_columns.append(f"  {name} {athena_type}")
+            if athena_type in ('INT', 'BIGINT') and values:
+                numbers = [int(v) for v in values]
+                projection.append(f"  'projection.{name}.type'='integer'")
+                projection.append(f"  'projection.{name}.range'='{min(numbers)},{max(numbers)}'")
+            else:
+                projection.append(f"  'projection.{name}.type'='enum'")
+                projection.append(f"  'projection.{name}.values'='{','.join(values)}'")
+        template = '/'.join(f"{name}=${{{name}}}" for name in partitions)
+        projection.append(f"  'storage.location.template'='s3://{bucket_name}/{folder_prefix.rstrip('/')}/{template}'")
+        partition_clause = "\nPARTITIONED BY (\n" + ',\n'.join(partition_columns) + "\n)"
+        projection_properties = ',\n' + ',\n'.join(projection)
     
     # DDL Statements
     ddl_statements = {}
@@ -165,13 +693,13 @@ def generate_athena_ddl(schema, bucket_name, folder_prefix, table_name):
     # 1. Regular S3 External Table
     regular_ddl = f"""-- Regular S3 External Table for {table_name}
 CREATE EXTERNAL TABLE IF NOT EXISTS database_name.{table_name} (
-{columns_str}
-)
+{table_columns_str}
+){partition_clause}
 STORED AS PARQUET
 LOCATION 's3://{bucket_name}/{folder_prefix}'
 TBLPROPERTIES (
   'parquet.compression'='SNAPPY',
-  'classification'='parquet'
+  'classification'='parquet'{projection_properties}
 );"""
     
     # 2. S3 Tables (Iceberg) using CTAS
@@ -248,6 +776,11 @@ def save_folder_schemas(all_folder_data, bucket_name, prefix):
                 f.write(ddl_content)
                 f.write("\n\n")
         
+        if data.get('drift'):
+            drift_file = os.path.join(folder_dir, "drift_report.json")
+            with open(drift_file, 'w', encoding='utf-8') as f:
+                json.dump(data['drift'], f, indent=2)
+        
         print(f"✅ Saved DDL for table '{folder_name}' in {folder_dir}/")
     
     # Create master summary
@@ -269,12 +802,42 @@ def save_folder_schemas(all_folder_data, bucket_name, prefix):
                 for i in range(len(data['schema'])):
                     field = data['schema'].field(i)
                     f.write(f"  - {field.name:30} {str(field.type):20}\n")
+                
+                if data.get('drift'):
+                    drift = data['drift']
+                    f.write(f"\nDrift Scan: {len(drift['diverging_files'])} of {drift['files']} file(s) diverge")
+                    f.write(f" (see {folder_name}/drift_report.json)\n" if drift['diverging_files'] else "\n")
+                    for item in drift['diverging_files']:
+                        f.write(f"  - {item['key']}\n")
+                
+                if data.get('profile'):
+                    table_profile = data['profile']
+                    f.write(f"\nProfile (footer statistics): {table_profile['rows']:,} rows, "
+                            f"{table_profile['files']} file(s), {table_profile['row_groups']} row group(s), "
+                            f"{table_profile['bytes'] / 1024 / 1024:,.1f} MB\n")
+                    f.write(f"  {'Column':30} {'Nulls':>12} {'Null %':>8}  Min / Max\n")
+                    for name, column in table_profile['columns'].items():
+                        nulls = 'n/a' if column['null_count'] is None else f"{column['null_count']:,}"
+                        fraction = 'n/a' if column['null_fraction'] is None else f"{column['null_fraction']:.2%}"
+                        f.write(f"  {name:30} {nulls:>12} {fraction:>8}  "
+                                f"{_display_value(column['min'])} / {_display_value(column['max'])}\n")
             else:
                 f.write("No schema available\n")
             f.write("\n")
     
     print(f"✅ Saved master summary: {summary_file}")
     
+    # Machine-readable table profiles
+    profiles = {
+        folder_name: data['profile'] for folder_name, data in all_folder_data.items() if data.get('profile')
+    }
+    if profiles:
+        profiles_file = os.path.join(output_dir, "TABLE_PROFILES.json")
+        with open(profiles_file, 'w', encoding='utf-8') as f:
+            json.dump({'source': f"s3://{bucket_name}/{prefix}", 'generated': timestamp, 'tables': profiles},
+                      f, indent=2, default=_display_value)
+        print(f"✅ Saved table profiles: {profiles_file}")
+    
     # Create README
     readme_file = os.path.join(output_dir, "README.md")
     with open(readme_file, 'w', encoding='utf-8') as f:
@@ -291,6 +854,7 @@ Each folder represents a table and contains:
 - `s3_tables_ctas.sql` - S3 Tables (Iceberg) using CTAS approach
 - `s3_tables_direct.sql` - Direct S3 Tables (Iceberg) creation
 - `all_ddl_statements.sql` - All DDL statements combined
+- `drift_report.json` - Files whose schema diverges from the rest (full drift scan only)
 
 ## Tables Found
 
@@ -301,7 +865,8 @@ Each folder represents a table and contains:
         f.write(f"""
 ## Usage
 
-1. Review `MASTER_SUMMARY.txt` for all table schemas
+1. Review `MASTER_SUMMARY.txt` for all table schemas (and row counts, nulls and min/max when profiled;
+   `TABLE_PROFILES.json` has the same statistics in machine-readable form)
 2. Navigate to each table's folder
 3. Choose the appropriate DDL file
 4. Update database names and locations as needed
@@ -319,9 +884,72 @@ Each folder represents a table and contains:
     print(f"\nTo get started, open: {summary_file}")
 
 
-def analyze_all_folders(bucket_name, prefix):
-    """Main function to analyze all folders under a prefix."""
-    s3_client = boto3.client('s3')
+def analyze_folder(s3_client, bucket_name, folder_prefix, file_workers=FOOTER_WORKERS, log=print, cache=None,
+                   full_drift=False, profile=False):
+    """
+    Analyze one folder and build its all_folder_data entry; returns (table_name, data or None).
+    full_drift adds a 'drift' report and profile a 'profile' of footer statistics, both
+    built from the footers of every file in the folder (read once for the two).
+    """
+    # Extract table name from folder path
+    table_name = folder_prefix.rstrip('/').split('/')[-1]
+    
+    # Analyze this folder's schemas
+    schema, schema_summary = analyze_folder_schemas(bucket_name, folder_prefix, s3_client, file_workers, log, cache)
+    
+    if not schema:
+        return table_name, None
+    
+    folder_footers = None
+    if full_drift or profile:
+        folder_footers = read_folder_footers(s3_client, bucket_name, folder_prefix, file_workers, cache)
+        parquet_keys = [obj['Key'] for obj, _, _ in folder_footers]
+    else:
+        parquet_keys = get_parquet_files_in_folder(s3_client, bucket_name, folder_prefix)
+    partitions = folder_partitions(parquet_keys, folder_prefix)
+    
+    drift = None
+    if full_drift:
+        drift = detect_schema_drift(s3_client, bucket_name, folder_prefix, folder_footers=folder_footers)
+        print_drift_report(drift, log)
+        for name, column in drift['columns'].items():
+            schema_summary[name].update(column['types'])
+    
+    # Generate DDL statements
+    ddl_statements = generate_athena_ddl(schema, bucket_name, folder_prefix, table_name, partitions)
+    
+    log(f"\n```sql")
+    log(ddl_statements['regular_s3'])
+    log("```")
+    
+    data = {
+        'folder_prefix': folder_prefix,
+        'schema': schema,
+        'schema_summary': schema_summary,
+        'ddl_statements': ddl_statements
+    }
+    if drift is not None:
+        data['drift'] = drift
+    if profile:
+        data['profile'] = profile_folder(s3_client, bucket_name, folder_prefix, folder_footers=folder_footers)
+        print_profile(data['profile'], log)
+    return table_name, data
+
+
+def analyze_all_folders(bucket_name, prefix, max_workers=1, cache_path=SCHEMA_CACHE_PATH, full_drift=False,
+                        profile=False, footer_workers=FOOTER_WORKERS):
+    """
+    Main function to analyze all folders under a prefix.
+    Each folder reads up to footer_workers footers at a time. With max_workers > 1, folders
+    are analyzed in parallel over one shared client; each folder's output is printed once
+    it is done, in folder order.
+    Footers are cached in cache_path by ETag, so reruns only read new or changed files
+    (None disables the cache). full_drift checks every file's footer for schema drift
+    instead of only the first five files. profile adds per-table row counts, null counts
+    and min/max from footer statistics to MASTER_SUMMARY.txt and TABLE_PROFILES.json.
+    """
+    s3_client = create_s3_client(max_workers, footer_workers)
+    cache = SchemaCache(cache_path) if cache_path else None
     
     print(f"\nScanning for folders in s3://{bucket_name}/{prefix}")
     print("=" * 80)
@@ -340,27 +968,35 @@ def analyze_all_folders(bucket_name, prefix):
     # Analyze each folder
     all_folder_data = {}
     
-    for folder_prefix in folders:
-        # Extract table name from folder path
-        table_name = folder_prefix.rstrip('/').split('/')[-1]
-        
-        # Analyze this folder's schemas
-        schema, schema_summary = analyze_folder_schemas(bucket_name, folder_prefix)
+    if max_workers > 1:
+        def analyze_buffered(folder_prefix):
+            lines = []
+            result = analyze_folder(
+                s3_client, bucket_name, folder_prefix, footer_workers, lines.append, cache, full_drift, profile
+            )
+            return result, lines
         
-        if schema:
-            # Generate DDL statements
-            ddl_statements = generate_athena_ddl(schema, bucket_name, folder_prefix, table_name)
-            
-            all_folder_data[table_name] = {
-                'folder_prefix': folder_prefix,
-                'schema': schema,
-                'schema_summary': schema_summary,
-                'ddl_statements': ddl_statements
-            }
-            
-            print(f"\n```sql")
-            print(ddl_statements['regular_s3'])
-            print("```")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = []
+            for result, lines in executor.map(analyze_buffered, folders):
+                print('\n'.join(lines))
+                results.append(result)
+    else:
+        results = (
+            analyze_folder(
+                s3_client, bucket_name, folder_prefix, footer_workers, cache=cache, full_drift=full_drift,
+                profile=profile
+            )
+            for folder_prefix in folders
+        )
+    
+    for table_name, data in results:
+        if data:
+            all_folder_data[table_name] = data
+    
+    if cache is not None:
+        cache.save()
+        print(f"\nSchema cache: {cache.hits} file(s) reused, {cache.misses} read from S3 ({cache.path})")
     
     # Save all results
     if all_folder_data:
@@ -379,4 +1015,4 @@ if __name__ == "__main__":
     PREFIX = "gold/"
     
     # Analyze all folders
-    analyze_all_folders(BUCKET, PREFIX)
\ No newline at end of file
+    analyze_all_folders(BUCKET, PREFIX, max_workers=SCAN_WORKERS, full_drift=True, profile=True)
\ No newline at end of file
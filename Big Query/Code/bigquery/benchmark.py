@@ -0,0 +1,294 @@
+"""
+Benchmark the S3 -> BigQuery bronze ingestion path without touching AWS or GCP.
+
+S3 is served by a local moto server (or any S3-compatible endpoint such as MinIO via
+--endpoint-url) and BigQuery is replaced by FakeBigQueryClient, which only records the
+load payloads. Synthetic MovieLens-shaped ratings CSVs are generated per size, and every
+(size, load mode) case runs in a fresh process so its peak RSS is measured in isolation.
+
+    python benchmark.py --sizes-mb 1 10 100 1000 --modes dataframe streaming arrow
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+import boto3
+import numpy as np
+import pandas as pd
+
+BENCH_BUCKET = 'bronze-benchmark'
+BENCH_PREFIX = 'movielens-bench'
+PROJECT_ID = 'benchmark-project'
+
+# Rough bytes per line of "userId,movieId,rating,timestamp" in MovieLens ratings.csv
+RATINGS_ROW_BYTES = 28
+GENERATE_BATCH_ROWS = 1_000_000
+
+BENCH_MODES = ('dataframe', 'streaming', 'arrow')
+MOTO_PORT = 5123
+
+
+class FakeLoadJob:
+    """Completed stand-in for a BigQuery LoadJob"""
+
+    def __init__(self, table_ref, rows, payload_bytes):
+        self.job_id = f"fake_{uuid.uuid4().hex[:12]}"
+        self.table_ref = table_ref
+        self.output_rows = rows
+        self.input_file_bytes = payload_bytes
+        self.error_result = None
+        self.started = self.ended = datetime.utcnow()
+
+    def result(self):
+        return self
+
+    def done(self):
+        return True
+
+    def to_api_repr(self):
+        return {'statistics': {'totalSlotMs': '0'}}
+
+
+class FakeBigQueryClient:
+    """Records what the bronze loader would send to BigQuery instead of sending it"""
+
+    def __init__(self):
+        self.loads = []
+        self.load_seconds = 0.0
+
+    def get_dataset(self, dataset_ref):
+        return dataset_ref
+
+    def create_dataset(self, dataset):
+        return dataset
+
+    def _record(self, table_ref, rows, payload_bytes):
+        self.loads.append({'table_ref': table_ref, 'rows': rows, 'bytes': payload_bytes})
+        return FakeLoadJob(table_ref, rows, payload_bytes)
+
+    def load_table_from_dataframe(self, df, table_ref, job_config=None):
+        # The real client serializes the frame to Parquet before uploading it, so do the same
+        started = time.perf_counter()
+        fd, path = tempfile.mkstemp(suffix='.parquet')
+        os.close(fd)
+        try:
+            df.to_parquet(path, index=False)
+            payload_bytes = os.path.getsize(path)
+        finally:
+            os.remove(path)
+        self.load_seconds += time.perf_counter() - started
+        return self._record(table_ref, len(df), payload_bytes)
+
+    def copy_table(self, source_ref, destination_ref, job_config=None):
+        return FakeLoadJob(destination_ref, None, 0)
+
+    def delete_table(self, table_ref, not_found_ok=False):
+        pass
+
+    def load_table_from_file(self, file_obj, table_ref, job_config=None):
+        # Read the payload through, as the real client would while uploading it
+        started = time.perf_counter()
+        payload_bytes = 0
+        for chunk in iter(lambda: file_obj.read(8 * 1024 * 1024), b''):
+            payload_bytes += len(chunk)
+        self.load_seconds += time.perf_counter() - started
+        return self._record(table_ref, None, payload_bytes)
+
+
+def _s3_client(endpoint_url):
+    return boto3.client(
+        's3',
+        endpoint_url=endpoint_url,
+        region_name='us-east-1',
+        aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID', 'testing'),
+        aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY', 'testing')
+    )
+
+
+def generate_ratings_csv(path, size_mb, seed=0):
+    """Write a ratings.csv-shaped file of roughly size_mb megabytes, returning its row count"""
+    rng = np.random.default_rng(seed)
+    target_rows = max(1, int(size_mb * 1024 * 1024 / RATINGS_ROW_BYTES))
+
+    written = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        while written < target_rows:
+            n = min(GENERATE_BATCH_ROWS, target_rows - written)
+            batch = pd.DataFrame({
+                'userId': rng.integers(1, 162_542, n),
+                'movieId': rng.integers(1, 209_172, n),
+                'rating': rng.integers(1, 11, n) / 2,
+                'timestamp': rng.integers(789_652_009, 1_574_327_703, n)
+            })
+            batch.to_csv(f, index=False, header=(written == 0))
+            written += n
+
+    return written
+
+
+def upload_datasets(s3_client, sizes_mb):
+    """Generate one ratings CSV per size and upload it, returning {size_mb: (key, rows, bytes)}"""
+    try:
+        s3_client.create_bucket(Bucket=BENCH_BUCKET)
+    except s3_client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+
+    datasets = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size_mb in sizes_mb:
+            local_path = os.path.join(tmp_dir, f"ratings_{size_mb}mb.csv")
+            rows = generate_ratings_csv(local_path, size_mb)
+            key = f"{BENCH_PREFIX}/{size_mb}mb/ratings.csv"
+            s3_client.upload_file(local_path, BENCH_BUCKET, key)
+            datasets[size_mb] = (key, rows, os.path.getsize(local_path))
+            print(f"Uploaded {key}: {rows:,} rows, {os.path.getsize(local_path) / 1024 / 1024:.1f} MB")
+            os.remove(local_path)
+
+    return datasets
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process in MB; None where the platform has no getrusage"""
+    try:
+        import resource  # POSIX only
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_case(endpoint_url, size_mb, mode, chunk_size):
+    """Run one ingestion in this (fresh) process and return its timings"""
+    from bigquery import S3ToBigQueryBronze
+
+    logging.getLogger('bigquery').setLevel(logging.WARNING)
+    baseline_rss = _peak_rss_mb()
+
+    bq_client = FakeBigQueryClient()
+    bronze = S3ToBigQueryBronze(
+        aws_access_key_id=None,
+        aws_secret_access_key=None,
+        project_id=PROJECT_ID,
+        schema_cache_path=None,
+        manifest_path=None,
+        s3_client=_s3_client(endpoint_url),
+        bq_client=bq_client
+    )
+
+    stages = {}
+
+    # Streaming interleaves extract and load chunk by chunk; time its loads where they happen
+    load_to_bronze = bronze.load_to_bronze
+
+    def timed_load_to_bronze(*args, **kwargs):
+        t = time.perf_counter()
+        try:
+            return load_to_bronze(*args, **kwargs)
+        finally:
+            stages['load'] = stages.get('load', 0.0) + time.perf_counter() - t
+
+    started = time.perf_counter()
+    csv_files = bronze.extract_all_csv_from_s3(BENCH_BUCKET, f"{BENCH_PREFIX}/{size_mb}mb/")
+    stages['list'] = time.perf_counter() - started
+
+    rows = 0
+    for file_key in csv_files:
+        table_name = bronze._bronze_table_name(file_key, 'bronze_')
+
+        if mode == 'dataframe':
+            t = time.perf_counter()
+            df = bronze.extract_csv_from_s3(BENCH_BUCKET, file_key)
+            stages['extract'] = stages.get('extract', 0.0) + time.perf_counter() - t
+
+            t = time.perf_counter()
+            bronze.load_to_bronze(df, table_name)
+            stages['load'] = stages.get('load', 0.0) + time.perf_counter() - t
+            rows += len(df)
+            del df
+        else:
+            # Extract and load are interleaved batch by batch in these modes, so the extract
+            # stage is whatever time the loads (timed separately) did not take
+            t = time.perf_counter()
+            if mode == 'streaming':
+                bronze.load_to_bronze = timed_load_to_bronze
+                rows += bronze.load_to_bronze_streaming(BENCH_BUCKET, file_key, table_name, chunk_size)
+                del bronze.load_to_bronze
+            else:
+                load_seconds = bq_client.load_seconds
+                rows += bronze.load_to_bronze_arrow(BENCH_BUCKET, file_key, table_name)
+                stages['load'] = stages.get('load', 0.0) + bq_client.load_seconds - load_seconds
+            stages['extract'] = stages.get('extract', 0.0) + time.perf_counter() - t
+
+    total = time.perf_counter() - started
+    if mode != 'dataframe' and 'extract' in stages:
+        stages['extract'] -= stages.get('load', 0.0)
+    return {
+        'size_mb': size_mb,
+        'mode': mode,
+        'rows': rows,
+        'seconds': round(total, 3),
+        'rows_per_sec': round(rows / total) if total else None,
+        'baseline_rss_mb': baseline_rss,
+        'peak_rss_mb': _peak_rss_mb(),
+        'stages': {name: round(seconds, 3) for name, seconds in stages.items()},
+        'load_calls': len(bq_client.loads),
+        'payload_mb': round(sum(load['bytes'] for load in bq_client.loads) / 1024 / 1024, 1)
+    }
+
+
+def run_benchmark(sizes_mb, modes, chunk_size, endpoint_url=None):
+    """Upload synthetic data and run every (size, mode) case in its own process"""
+    server = None
+    if endpoint_url is None:
+        from moto.server import ThreadedMotoServer
+
+        server = ThreadedMotoServer(ip_address='127.0.0.1', port=MOTO_PORT)
+        server.start()
+        endpoint_url = f"http://127.0.0.1:{MOTO_PORT}"
+
+    try:
+        upload_datasets(_s3_client(endpoint_url), sizes_mb)
+
+        # One task per child, so ru_maxrss is the peak of that case alone
+        context = multiprocessing.get_context('spawn')
+        results = []
+        with context.Pool(processes=1, maxtasksperchild=1) as pool:
+            for size_mb in sizes_mb:
+                for mode in modes:
+                    result = pool.apply(run_case, (endpoint_url, size_mb, mode, chunk_size))
+                    results.append(result)
+                    peak_rss = 'n/a' if result['peak_rss_mb'] is None else f"{result['peak_rss_mb']:.1f}"
+                    print(f"{size_mb:>8} MB  {mode:<10} {result['rows']:>12,} rows  "
+                          f"{result['rows_per_sec'] or 0:>12,} rows/s  "
+                          f"peak RSS {peak_rss:>8} MB  stages {result['stages']}")
+        return results
+
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the bronze ingestion path locally")
+    parser.add_argument('--sizes-mb', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--modes', nargs='+', choices=BENCH_MODES, default=list(BENCH_MODES))
+    parser.add_argument('--chunk-size', type=int, default=500_000)
+    parser.add_argument('--endpoint-url', default=None,
+                        help="S3-compatible endpoint (e.g. MinIO); defaults to an in-process moto server")
+    parser.add_argument('--output', default=None, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.sizes_mb, args.modes, args.chunk_size, args.endpoint_url)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
@@ -1,8 +1,21 @@
 import boto3
 import pandas as pd
 from google.cloud import bigquery
+from google.cloud import storage
+from google.api_core.exceptions import NotFound
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
 from io import StringIO
+import base64
+import csv
+import json
 import logging
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from dotenv import load_dotenv
 import os
@@ -14,13 +27,50 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Rows per batch when streaming large CSVs from S3
+DEFAULT_CHUNK_SIZE = 500_000
+
+# Next wider pandas dtype for a streamed column whose later batches do not fit the first batch's type
+WIDER_DTYPES = {'Int64': 'Float64', 'Float64': 'string', 'boolean': 'string'}
+
+# Bytes per Arrow CSV block in the Parquet load path
+DEFAULT_ARROW_BLOCK_SIZE = 64 * 1024 * 1024
+
+# Per-source-file Arrow schemas, so type inference only happens on the first load of each object version
+DEFAULT_SCHEMA_CACHE_PATH = 'bronze_schema_cache.json'
+
+# S3 object fingerprints of the last successful load, used by incremental runs
+DEFAULT_MANIFEST_PATH = 'bronze_manifest.json'
+
+# Resumable upload part size when staging S3 objects in GCS (must be a multiple of 256 KB)
+DEFAULT_GCS_PART_SIZE = 32 * 1024 * 1024
+
+# How each CSV travels from S3 to BigQuery
+LOAD_MODES = ('dataframe', 'streaming', 'arrow', 'gcs')
+
+# Modes that submit a single load job per file and can be polled without blocking
+ASYNC_LOAD_MODES = ('dataframe', 'arrow', 'gcs')
+
+# Seconds a cached dataset/table metadata lookup stays valid
+DEFAULT_METADATA_TTL = 300
+
+# Bronze partitioning: 'ingestion' (ingestion-time, _PARTITIONTIME) or a DATETIME/TIMESTAMP column name
+INGESTION_TIME_PARTITIONING = 'ingestion'
+
+# Columns the loader adds to every row; the 'gcs' mode loads the raw CSV and has none of them
+METADATA_COLUMNS = ('_ingestion_timestamp', '_source_file', '_source_bucket')
+
 
 class S3ToBigQueryBronze:
     def __init__(self, aws_access_key_id, aws_secret_access_key, 
-                 project_id, dataset_id='bronze_layer', aws_region='eu-north-1'):
+                 project_id, dataset_id='bronze_layer', aws_region='eu-north-1',
+                 schema_cache_path=DEFAULT_SCHEMA_CACHE_PATH, manifest_path=DEFAULT_MANIFEST_PATH,
+                 gcs_staging_bucket=None, write_disposition='WRITE_TRUNCATE', partition_by=None,
+                 merge_keys=None, merge_order_by=None, metadata_ttl=DEFAULT_METADATA_TTL, s3_client=None,
+                 bq_client=None):
        
-        # Initialize S3 client with correct region
-        self.s3_client = boto3.client(
+        # Initialize S3 client with correct region (or use the one passed in, e.g. a local stand-in)
+        self.s3_client = s3_client or boto3.client(
             's3',
             aws_access_key_id=aws_access_key_id,
             aws_secret_access_key=aws_secret_access_key,
@@ -28,19 +78,73 @@ class S3ToBigQueryBronze:
         )
         
         # Initialize BigQuery client with Application Default Credentials
-        self.bq_client = bigquery.Client(project=project_id)
+        self.bq_client = bq_client or bigquery.Client(project=project_id)
         
         self.project_id = project_id
         self.dataset_id = dataset_id
         
+        # Default write disposition and daily partitioning applied to every bronze load
+        self.write_disposition = write_disposition
+        self.partition_by = partition_by
+        
+        # Natural keys per bronze table, e.g. {'bronze_ratings': ['userId', 'movieId']};
+        # these tables are loaded into a staging table and merged instead of written directly
+        self.merge_keys = merge_keys or {}
+        
+        # Source column ordering versions of a key, e.g. {'bronze_ratings': 'timestamp'}; the latest
+        # row wins, both within a load and against the bronze table. Without one, the last load wins
+        self.merge_order_by = merge_order_by or {}
+        
+        # GCS bucket for the 'gcs' load mode; the client is only needed when it is set
+        self.gcs_staging_bucket = gcs_staging_bucket
+        self.gcs_client = storage.Client(project=project_id) if gcs_staging_bucket else None
+        
+        # Arrow schemas keyed by s3://bucket/key, shared across worker threads
+        self.schema_cache_path = schema_cache_path
+        self._schema_cache = self._read_schema_cache()
+        self._schema_cache_lock = threading.Lock()
+        
+        # Ingestion manifest keyed by s3://bucket/key
+        self.manifest_path = manifest_path
+        self._manifest = self._read_manifest()
+        self._manifest_lock = threading.Lock()
+        
+        # BigQuery metadata lookups keyed by ('dataset',), ('tables',) or ('table', name),
+        # each stored with its expiry time
+        self.metadata_ttl = metadata_ttl
+        self._metadata_cache = {}
+        self._metadata_cache_lock = threading.Lock()
+        
         # Create bronze dataset
         self._create_bronze_dataset()
     
+    def _cached_metadata(self, key, loader):
+        """Return a cached metadata value, calling loader() on a miss or after the TTL has expired"""
+        now = time.monotonic()
+        with self._metadata_cache_lock:
+            entry = self._metadata_cache.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+        
+        value = loader()
+        with self._metadata_cache_lock:
+            self._metadata_cache[key] = (now + self.metadata_ttl, value)
+        return value
+    
+    def invalidate_metadata(self, table_name=None):
+        """Drop cached metadata for one table (and the table list), or everything when table_name is None"""
+        with self._metadata_cache_lock:
+            if table_name is None:
+                self._metadata_cache.clear()
+            else:
+                self._metadata_cache.pop(('table', table_name), None)
+                self._metadata_cache.pop(('tables',), None)
+    
     def _create_bronze_dataset(self):
         """Create BigQuery dataset for bronze layer if it doesn't exist"""
         dataset_ref = f"{self.project_id}.{self.dataset_id}"
         try:
-            self.bq_client.get_dataset(dataset_ref)
+            self._cached_metadata(('dataset',), lambda: self.bq_client.get_dataset(dataset_ref))
             logger.info(f"Dataset {dataset_ref} already exists")
         except Exception:
             dataset = bigquery.Dataset(dataset_ref)
@@ -73,15 +177,341 @@ class S3ToBigQueryBronze:
             logger.error(f"Error extracting file from S3: {str(e)}")
             raise
     
-    def load_to_bronze(self, df, table_name, write_disposition='WRITE_TRUNCATE'):
+    def iter_csv_chunks_from_s3(self, bucket_name, file_key, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Yield DataFrames of at most chunk_size rows, reading the S3 body incrementally"""
+        try:
+            logger.info(f"Streaming {file_key} from bucket {bucket_name} in chunks of {chunk_size} rows")
+            
+            response = self.s3_client.get_object(Bucket=bucket_name, Key=file_key)
+            
+            # Same timestamp for every chunk of one file
+            ingestion_timestamp = datetime.utcnow()
+            
+            # pandas pulls from the StreamingBody as it parses, so only one chunk is held at a time
+            reader = pd.read_csv(response['Body'], chunksize=chunk_size, encoding='utf-8')
+            for chunk in reader:
+                chunk['_ingestion_timestamp'] = ingestion_timestamp
+                chunk['_source_file'] = file_key
+                chunk['_source_bucket'] = bucket_name
+                yield chunk
+            
+        except Exception as e:
+            logger.error(f"Error streaming file from S3: {str(e)}")
+            raise
+    
+    def load_to_bronze_streaming(self, bucket_name, file_key, table_name,
+                                 chunk_size=DEFAULT_CHUNK_SIZE, write_disposition=None):
+        """Load a CSV batch by batch into a streaming table, then copy it over table_name with
+        write_disposition, so a failed file never leaves table_name truncated or half-written.
+        Every batch is cast to the column types of the first; when a later batch does not fit,
+        that column is widened (integer -> float -> string) and the file is streamed again"""
+        stream_table = self._streaming_table_name(table_name)
+        try:
+            dtypes = None
+            while True:
+                total_rows, dtypes, widened = self._stream_chunks(
+                    bucket_name, file_key, stream_table, chunk_size, dtypes
+                )
+                if widened is None:
+                    break
+                logger.warning(f"Column '{widened}' of {file_key} does not fit its first batch's type, "
+                               f"restarting as {dtypes[widened]}")
+            
+            dataset_ref = f"{self.project_id}.{self.dataset_id}"
+            job_config = bigquery.CopyJobConfig(write_disposition=write_disposition or self.write_disposition)
+            self.bq_client.copy_table(
+                f"{dataset_ref}.{stream_table}", f"{dataset_ref}.{table_name}", job_config=job_config
+            ).result()
+            self.invalidate_metadata(table_name)
+            
+            logger.info(f"Successfully streamed {total_rows} rows from {file_key} to {table_name}")
+            return total_rows
+            
+        except Exception as e:
+            logger.error(f"Error streaming {file_key} to BigQuery: {str(e)}")
+            raise
+        finally:
+            self.bq_client.delete_table(f"{self.project_id}.{self.dataset_id}.{stream_table}", not_found_ok=True)
+            self.invalidate_metadata(stream_table)
+    
+    def _stream_chunks(self, bucket_name, file_key, table_name, chunk_size, dtypes=None):
+        """Load every batch of a CSV into table_name, replacing its contents.
+        Returns (rows, dtypes, None), or (rows so far, widened dtypes, column) at the first batch
+        whose column does not fit dtypes; nothing past that batch is loaded"""
+        total_rows = 0
+        disposition = 'WRITE_TRUNCATE'
+        for chunk_number, chunk in enumerate(
+            self.iter_csv_chunks_from_s3(bucket_name, file_key, chunk_size), start=1
+        ):
+            if dtypes is None:
+                dtypes = self._pinned_dtypes(chunk)
+            for column, dtype in dtypes.items():
+                try:
+                    chunk[column] = chunk[column].astype(dtype)
+                except (TypeError, ValueError):
+                    return total_rows, dict(dtypes, **{column: WIDER_DTYPES.get(dtype, 'string')}), column
+            self.load_to_bronze(chunk, table_name, write_disposition=disposition)
+            total_rows += len(chunk)
+            disposition = 'WRITE_APPEND'
+            logger.info(f"  Chunk {chunk_number}: {total_rows} rows loaded so far")
+        return total_rows, dtypes, None
+    
+    @staticmethod
+    def _pinned_dtypes(chunk):
+        """Nullable dtypes for a first chunk's columns. pandas infers each chunk on its own, so a later
+        chunk with a missing value would turn int64 into float64 (and bool into object); all-null
+        columns become strings"""
+        nullable = {'int64': 'Int64', 'float64': 'Float64', 'bool': 'boolean', 'object': 'string'}
+        return {
+            column: 'string' if chunk[column].isna().all() else nullable.get(str(dtype), dtype)
+            for column, dtype in chunk.dtypes.items()
+        }
+    
+    def _read_schema_cache(self):
+        """Load cached Arrow schemas from disk"""
+        if not self.schema_cache_path or not os.path.exists(self.schema_cache_path):
+            return {}
+        with open(self.schema_cache_path, 'r', encoding='utf-8') as f:
+            encoded = json.load(f)
+        return {
+            source: pa.ipc.read_schema(pa.py_buffer(base64.b64decode(value)))
+            for source, value in encoded.items()
+        }
+    
+    def _write_schema_cache(self):
+        """Persist cached Arrow schemas to disk"""
+        if not self.schema_cache_path:
+            return
+        encoded = {
+            source: base64.b64encode(schema.serialize().to_pybytes()).decode('ascii')
+            for source, schema in self._schema_cache.items()
+        }
+        with open(self.schema_cache_path, 'w', encoding='utf-8') as f:
+            json.dump(encoded, f, indent=2)
+    
+    def _cache_csv_schema(self, source, schema, etag):
+        """Remember the schema inferred for a source file (all-null columns become strings).
+        The object's ETag is kept in the schema metadata so a changed object is re-inferred"""
+        fields = [
+            pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+            for field in schema
+        ]
+        with self._schema_cache_lock:
+            self._schema_cache[source] = pa.schema(fields, metadata={'etag': etag})
+            self._write_schema_cache()
+    
+    def _cached_csv_schema(self, source, etag):
+        """Cached schema for a source file, or None if there is none or the object has changed since"""
+        cached_schema = self._schema_cache.get(source)
+        if cached_schema is None or (cached_schema.metadata or {}).get(b'etag') != etag.encode():
+            return None
+        return cached_schema
+    
+    def _read_csv_header(self, bucket_name, file_key, num_bytes=64 * 1024):
+        """Column names from the first line of an S3 CSV (one small ranged GET); returns (names, ETag)"""
+        response = self.s3_client.get_object(Bucket=bucket_name, Key=file_key, Range=f"bytes=0-{num_bytes - 1}")
+        first_line = response['Body'].read().decode('utf-8-sig', errors='replace').splitlines()[:1]
+        names = next(csv.reader(first_line), [])
+        return names, response['ETag'].strip('"')
+    
+    def _open_csv_reader(self, bucket_name, file_key, block_size, column_types=None):
+        """Open a streaming Arrow CSV reader on an S3 object; returns (reader, ETag)"""
+        response = self.s3_client.get_object(Bucket=bucket_name, Key=file_key)
+        reader = pa_csv.open_csv(
+            response['Body'],
+            read_options=pa_csv.ReadOptions(block_size=block_size),
+            convert_options=pa_csv.ConvertOptions(column_types=column_types)
+        )
+        return reader, response['ETag'].strip('"')
+    
+    @staticmethod
+    def _arrow_to_bq_schema(schema):
+        """Map an Arrow schema to BigQuery SchemaFields"""
+        fields = []
+        for field in schema:
+            arrow_type = field.type
+            if pa.types.is_integer(arrow_type):
+                bq_type = 'INT64'
+            elif pa.types.is_floating(arrow_type):
+                bq_type = 'FLOAT64'
+            elif pa.types.is_boolean(arrow_type):
+                bq_type = 'BOOL'
+            elif pa.types.is_timestamp(arrow_type):
+                bq_type = 'TIMESTAMP' if arrow_type.tz else 'DATETIME'
+            elif pa.types.is_date(arrow_type):
+                bq_type = 'DATE'
+            elif pa.types.is_decimal(arrow_type):
+                bq_type = 'NUMERIC'
+            else:
+                bq_type = 'STRING'
+            fields.append(bigquery.SchemaField(field.name, bq_type, mode='NULLABLE'))
+        return fields
+    
+    def load_to_bronze_arrow(self, bucket_name, file_key, table_name,
+                             write_disposition=None, block_size=DEFAULT_ARROW_BLOCK_SIZE, wait=True):
+        """Convert a CSV to compressed Parquet via Arrow record batches and load it with an explicit schema.
+        Returns the row count, or the submitted LoadJob when wait=False"""
+        try:
+            source = f"s3://{bucket_name}/{file_key}"
+            table_ref = f"{self.project_id}.{self.dataset_id}.{table_name}"
+            logger.info(f"Converting {source} to Parquet for {table_ref}")
+            
+            # Reuse the cached schema while the object (ETag) and header are unchanged,
+            # otherwise infer from the first block
+            header, etag = self._read_csv_header(bucket_name, file_key)
+            cached_schema = self._cached_csv_schema(source, etag)
+            if cached_schema is not None and cached_schema.names != header:
+                cached_schema = None
+            
+            reader, etag = self._open_csv_reader(bucket_name, file_key, block_size, cached_schema)
+            if cached_schema is None:
+                self._cache_csv_schema(source, reader.schema, etag)
+                logger.info(f"Cached inferred schema for {source}")
+            csv_schema = self._schema_cache[source]
+            
+            ingestion_timestamp = pa.scalar(datetime.utcnow(), type=pa.timestamp('us'))
+            output_schema = (
+                csv_schema.remove_metadata()
+                .append(pa.field('_ingestion_timestamp', pa.timestamp('us')))
+                .append(pa.field('_source_file', pa.string()))
+                .append(pa.field('_source_bucket', pa.string()))
+            )
+            
+            total_rows = 0
+            # A plain temp path: an open NamedTemporaryFile can't be reopened by name on Windows
+            fd, parquet_path = tempfile.mkstemp(suffix='.parquet')
+            os.close(fd)
+            try:
+                with pq.ParquetWriter(parquet_path, output_schema, compression='zstd') as writer:
+                    for batch in reader:
+                        num_rows = batch.num_rows
+                        # Select by name, so columns can't be swapped by position
+                        columns = [batch.column(field.name).cast(field.type) for field in csv_schema]
+                        columns += [
+                            pa.repeat(ingestion_timestamp, num_rows),
+                            pa.repeat(pa.scalar(file_key, type=pa.string()), num_rows),
+                            pa.repeat(pa.scalar(bucket_name, type=pa.string()), num_rows),
+                        ]
+                        writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=output_schema))
+                        total_rows += num_rows
+                
+                job_config = self._bronze_load_job_config(
+                    write_disposition,
+                    source_format=bigquery.SourceFormat.PARQUET,
+                    schema=self._arrow_to_bq_schema(output_schema)
+                )
+                
+                # The upload finishes inside load_table_from_file, so the temp file can go afterwards
+                with open(parquet_path, 'rb') as f:
+                    job = self.bq_client.load_table_from_file(f, table_ref, job_config=job_config)
+            finally:
+                os.remove(parquet_path)
+            
+            if not wait:
+                logger.info(f"Submitted load job {job.job_id} for {table_ref} ({total_rows} rows)")
+                return job
+            job.result()
+            self.invalidate_metadata(table_name)
+            
+            logger.info(f"Successfully loaded {total_rows} rows to {table_ref} via Parquet")
+            return total_rows
+            
+        except Exception as e:
+            logger.error(f"Error loading {file_key} via Arrow: {str(e)}")
+            raise
+    
+    def _gcs_staging_blob(self, file_key):
+        """Staging blob for an S3 object in the 'gcs' load mode"""
+        return self.gcs_client.bucket(self.gcs_staging_bucket).blob(f"bronze_staging/{file_key}")
+    
+    def _delete_gcs_staging_blob(self, file_key):
+        """Remove the staging blob of a 'gcs' load; it may never have been written"""
+        try:
+            self._gcs_staging_blob(file_key).delete()
+        except NotFound:
+            pass
+    
+    def load_to_bronze_via_gcs(self, bucket_name, file_key, table_name,
+                               write_disposition=None, part_size=DEFAULT_GCS_PART_SIZE, wait=True):
+        """Copy the S3 object into a GCS staging blob part by part and load it from its gs:// URI.
+        Returns the row count, or the submitted LoadJob when wait=False (the caller then owns the staging blob)"""
+        if not self.gcs_staging_bucket:
+            raise ValueError("gcs_staging_bucket must be set to use the 'gcs' load mode")
+        if self.partition_by in METADATA_COLUMNS:
+            raise ValueError(f"partition_by='{self.partition_by}' is not loaded in the 'gcs' load mode; "
+                             f"use partition_by='{INGESTION_TIME_PARTITIONING}' or a CSV column")
+        
+        job = None
+        try:
+            source = f"s3://{bucket_name}/{file_key}"
+            table_ref = f"{self.project_id}.{self.dataset_id}.{table_name}"
+            blob = self._gcs_staging_blob(file_key)
+            gcs_uri = f"gs://{self.gcs_staging_bucket}/{blob.name}"
+            
+            # Resumable upload fed straight from the S3 body, one part in memory at a time
+            logger.info(f"Staging {source} to {gcs_uri}")
+            response = self.s3_client.get_object(Bucket=bucket_name, Key=file_key)
+            with blob.open('wb', chunk_size=part_size, content_type='text/csv') as writer:
+                shutil.copyfileobj(response['Body'], writer, part_size)
+            
+            # BigQuery parses the staged file server-side and maps columns by position,
+            # so only use a cached schema inferred from this exact object
+            cached_schema = self._cached_csv_schema(source, response['ETag'].strip('"'))
+            job_config = self._bronze_load_job_config(
+                write_disposition,
+                source_format=bigquery.SourceFormat.CSV,
+                skip_leading_rows=1,
+                allow_quoted_newlines=True
+            )
+            if cached_schema is not None:
+                job_config.schema = self._arrow_to_bq_schema(cached_schema)
+            else:
+                job_config.autodetect = True
+            
+            job = self.bq_client.load_table_from_uri(gcs_uri, table_ref, job_config=job_config)
+            if not wait:
+                logger.info(f"Submitted load job {job.job_id} for {table_ref}")
+                return job
+            job.result()
+            self.invalidate_metadata(table_name)
+            
+            logger.info(f"Successfully loaded {job.output_rows} rows to {table_ref} from {gcs_uri}")
+            return job.output_rows
+            
+        except Exception as e:
+            logger.error(f"Error loading {file_key} via GCS: {str(e)}")
+            raise
+        finally:
+            # The staging copy is only kept while a submitted job the caller waits on still needs it
+            if wait or job is None:
+                self._delete_gcs_staging_blob(file_key)
+    
+    def _bronze_load_job_config(self, write_disposition=None, **kwargs):
+        """LoadJobConfig with the loader's write disposition and partitioning applied"""
+        job_config = bigquery.LoadJobConfig(
+            write_disposition=write_disposition or self.write_disposition,
+            **kwargs
+        )
+        
+        if self.partition_by == INGESTION_TIME_PARTITIONING:
+            job_config.time_partitioning = bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY)
+        elif self.partition_by:
+            job_config.time_partitioning = bigquery.TimePartitioning(
+                type_=bigquery.TimePartitioningType.DAY,
+                field=self.partition_by
+            )
+        
+        return job_config
+    
+    def load_to_bronze(self, df, table_name, write_disposition=None, wait=True):
      
         try:
             table_ref = f"{self.project_id}.{self.dataset_id}.{table_name}"
             logger.info(f"Loading data to Bronze: {table_ref}")
             
             # Configure load job
-            job_config = bigquery.LoadJobConfig(
-                write_disposition=write_disposition,
+            job_config = self._bronze_load_job_config(
+                write_disposition,
                 autodetect=True  # Auto-detect schema from DataFrame
             )
             
@@ -90,16 +520,22 @@ class S3ToBigQueryBronze:
                 df, table_ref, job_config=job_config
             )
             
+            if not wait:
+                logger.info(f"Submitted load job {job.job_id} for {table_ref} ({len(df)} rows)")
+                return job
+            
             # Wait for job to complete
             job.result()
+            self.invalidate_metadata(table_name)
             
             logger.info(f"Successfully loaded {len(df)} rows to {table_ref}")
+            return job
             
         except Exception as e:
             logger.error(f"Error loading data to BigQuery: {str(e)}")
             raise
     
-    def extract_all_csv_from_s3(self, bucket_name, prefix=''):
+    def extract_all_csv_from_s3(self, bucket_name, prefix='', include_metadata=False):
         
         try:
             logger.info(f"Listing CSV files in bucket {bucket_name} with prefix '{prefix}'")
@@ -113,7 +549,17 @@ class S3ToBigQueryBronze:
                 if 'Contents' in page:
                     for obj in page['Contents']:
                         key = obj['Key']
-                        if key.lower().endswith('.csv'):
+                        if not key.lower().endswith('.csv'):
+                            continue
+                        if include_metadata:
+                            # Fingerprint used by the ingestion manifest
+                            csv_files.append({
+                                'key': key,
+                                'etag': obj['ETag'].strip('"'),
+                                'size': obj['Size'],
+                                'last_modified': obj['LastModified'].isoformat()
+                            })
+                        else:
                             csv_files.append(key)
             
             logger.info(f"Found {len(csv_files)} CSV files")
@@ -123,33 +569,200 @@ class S3ToBigQueryBronze:
             logger.error(f"Error listing S3 objects: {str(e)}")
             raise
     
-    def create_bronze_tables(self, bucket_name, prefix='', table_prefix='bronze_'):
+    def _read_manifest(self):
+        """Load the ingestion manifest from disk"""
+        if not self.manifest_path or not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def _write_manifest(self):
+        """Persist the ingestion manifest to disk"""
+        if not self.manifest_path:
+            return
+        with open(self.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(self._manifest, f, indent=2, sort_keys=True)
+    
+    def _is_unchanged(self, bucket_name, obj, table_name):
+        """True if this object was already loaded into table_name with the same fingerprint"""
+        entry = self._manifest.get(f"s3://{bucket_name}/{obj['key']}")
+        if entry is None:
+            return False
+        return (
+            entry['table_name'] == table_name
+            and entry['etag'] == obj['etag']
+            and entry['size'] == obj['size']
+            and entry['last_modified'] == obj['last_modified']
+        )
+    
+    def _record_ingestion(self, bucket_name, obj, table_name):
+        """Record a successful load in the manifest"""
+        with self._manifest_lock:
+            self._manifest[f"s3://{bucket_name}/{obj['key']}"] = {
+                'table_name': table_name,
+                'etag': obj['etag'],
+                'size': obj['size'],
+                'last_modified': obj['last_modified'],
+                'loaded_at': datetime.utcnow().isoformat()
+            }
+            self._write_manifest()
+    
+    def _select_csv_files(self, bucket_name, prefix, table_prefix, incremental):
+        """List CSVs to load; incremental runs drop objects unchanged since their last load"""
+        if not incremental:
+            return self.extract_all_csv_from_s3(bucket_name, prefix), {}, []
+        
+        objects = self.extract_all_csv_from_s3(bucket_name, prefix, include_metadata=True)
+        pending, skipped = {}, []
+        for obj in objects:
+            if self._is_unchanged(bucket_name, obj, self._bronze_table_name(obj['key'], table_prefix)):
+                skipped.append(obj['key'])
+            else:
+                pending[obj['key']] = obj
+        
+        logger.info(f"Incremental run: {len(pending)} new or modified, {len(skipped)} unchanged")
+        return list(pending), pending, skipped
+    
+    def merge_into_bronze(self, staging_table, table_name, keys):
+        """Merge a freshly loaded staging table into a bronze table on its natural keys, then drop the staging table"""
+        try:
+            dataset_ref = f"{self.project_id}.{self.dataset_id}"
+            staging_ref = f"{dataset_ref}.{staging_table}"
+            target_ref = f"{dataset_ref}.{table_name}"
+            
+            # First load: the staging table already has the right schema and partitioning
+            try:
+                self.bq_client.get_table(target_ref)
+            except Exception:
+                self.bq_client.copy_table(staging_ref, target_ref).result()
+                self.bq_client.delete_table(staging_ref)
+                self.invalidate_metadata(staging_table)
+                self.invalidate_metadata(table_name)
+                logger.info(f"Created {target_ref} from {staging_ref}")
+                return
+            
+            columns = [field.name for field in self._get_table(staging_table).schema]
+            updates = ', '.join(f"T.`{c}` = S.`{c}`" for c in columns if c not in keys)
+            on_clause = ' AND '.join(f"T.`{k}` = S.`{k}`" for k in keys)
+            key_list = ', '.join(f"`{k}`" for k in keys)
+            
+            # Deduplicate the incoming rows as well, keeping the latest per key. _ingestion_timestamp
+            # is the same for every row of a load, so it only serves as a fallback
+            order_column = self.merge_order_by.get(table_name)
+            if order_column:
+                order_by = f"`{order_column}` DESC"
+                matched = f"WHEN MATCHED AND S.`{order_column}` >= T.`{order_column}`"
+            else:
+                order_by = '`_ingestion_timestamp` DESC' if '_ingestion_timestamp' in columns else '1'
+                matched = 'WHEN MATCHED'
+            query = f"""
+            MERGE `{target_ref}` T
+            USING (
+                SELECT * FROM `{staging_ref}`
+                WHERE TRUE
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY {key_list} ORDER BY {order_by}) = 1
+            ) S
+            ON {on_clause}
+            {f'{matched} THEN UPDATE SET {updates}' if updates else ''}
+            WHEN NOT MATCHED THEN INSERT ROW
+            """
+            
+            job = self.bq_client.query(query)
+            job.result()
+            self.bq_client.delete_table(staging_ref)
+            self.invalidate_metadata(staging_table)
+            self.invalidate_metadata(table_name)
+            
+            logger.info(f"Merged {staging_ref} into {target_ref} on ({key_list}): "
+                        f"{job.num_dml_affected_rows} rows affected")
+            
+        except Exception as e:
+            logger.error(f"Error merging into {table_name}: {str(e)}")
+            raise
+    
+    def _bronze_table_name(self, file_key, table_prefix):
+        """Generate bronze table name from file name"""
+        file_name = file_key.split('/')[-1].replace('.csv', '')
+        return f"{table_prefix}{file_name}".replace('-', '_').replace(' ', '_').lower()
+    
+    @staticmethod
+    def _staging_table_name(table_name):
+        """Staging table used to merge a bronze table on its natural keys"""
+        return f"{table_name}__staging"
+    
+    @staticmethod
+    def _streaming_table_name(table_name):
+        """Table the batches of a streaming load collect in before they replace table_name"""
+        return f"{table_name}__streaming"
+    
+    def _load_bronze_file(self, bucket_name, file_key, table_name,
+                          load_mode='dataframe', chunk_size=DEFAULT_CHUNK_SIZE):
+        """Extract one CSV and load it into its bronze table, returning a per-file result"""
+        if load_mode not in LOAD_MODES:
+            raise ValueError(f"Unknown load_mode '{load_mode}', expected one of {LOAD_MODES}")
+        
+        started = time.monotonic()
+        
+        # Tables with natural keys are loaded into a fresh staging table and merged afterwards
+        keys = self.merge_keys.get(table_name)
+        load_table = self._staging_table_name(table_name) if keys else table_name
+        disposition = 'WRITE_TRUNCATE' if keys else None
+        
+        if load_mode == 'gcs':
+            # S3 -> GCS staging blob -> BigQuery load job, data never materialized here
+            rows = self.load_to_bronze_via_gcs(bucket_name, file_key, load_table, disposition)
+        elif load_mode == 'arrow':
+            # CSV -> Arrow batches -> Parquet, no pandas round-trip
+            rows = self.load_to_bronze_arrow(bucket_name, file_key, load_table, disposition)
+        elif load_mode == 'streaming':
+            # Extract and load in bounded-size batches
+            rows = self.load_to_bronze_streaming(bucket_name, file_key, load_table, chunk_size, disposition)
+        else:
+            # Extract from S3
+            df = self.extract_csv_from_s3(bucket_name, file_key)
+            
+            # Load to BigQuery
+            self.load_to_bronze(df, load_table, disposition)
+            rows = len(df)
+        
+        if keys:
+            self.merge_into_bronze(load_table, table_name, keys)
+        
+        return {
+            'file_key': file_key,
+            'table_name': table_name,
+            'rows': rows,
+            'seconds': round(time.monotonic() - started, 2)
+        }
+    
+    def create_bronze_tables(self, bucket_name, prefix='', table_prefix='bronze_',
+                             load_mode='dataframe', chunk_size=DEFAULT_CHUNK_SIZE, incremental=False):
       
         try:
             logger.info("=" * 60)
             logger.info("Creating Bronze Layer Tables from S3")
             logger.info("=" * 60)
             
-            # Get all CSV files
-            csv_files = self.extract_all_csv_from_s3(bucket_name, prefix)
+            # Get all CSV files (only new or modified ones when incremental)
+            csv_files, fingerprints, skipped = self._select_csv_files(
+                bucket_name, prefix, table_prefix, incremental
+            )
             
             if not csv_files:
-                logger.warning("No CSV files found in S3 bucket")
+                if skipped:
+                    logger.info("All CSV files unchanged since last load, nothing to do")
+                else:
+                    logger.warning("No CSV files found in S3 bucket")
                 return []
             
             # Process each file
             created_tables = []
             for file_key in csv_files:
                 try:
-                    # Extract from S3
-                    df = self.extract_csv_from_s3(bucket_name, file_key)
-                    
-                    # Generate table name from file name
-                    file_name = file_key.split('/')[-1].replace('.csv', '')
-                    table_name = f"{table_prefix}{file_name}".replace('-', '_').replace(' ', '_').lower()
-                    
-                    # Load to BigQuery
-                    self.load_to_bronze(df, table_name)
+                    table_name = self._bronze_table_name(file_key, table_prefix)
+                    self._load_bronze_file(bucket_name, file_key, table_name, load_mode, chunk_size)
+                    if incremental:
+                        self._record_ingestion(bucket_name, fingerprints[file_key], table_name)
                     created_tables.append(table_name)
                     
                 except Exception as e:
@@ -168,16 +781,202 @@ class S3ToBigQueryBronze:
             logger.error(f"Bronze layer creation failed: {str(e)}")
             raise
     
-    def create_single_bronze_table(self, bucket_name, file_key, table_name):
+    def create_bronze_tables_concurrent(self, bucket_name, prefix='', table_prefix='bronze_',
+                                        max_workers=4, load_mode='dataframe', chunk_size=DEFAULT_CHUNK_SIZE,
+                                        incremental=False):
+        """Load every CSV under prefix through a bounded worker pool and return a run summary"""
+        try:
+            logger.info("=" * 60)
+            logger.info(f"Creating Bronze Layer Tables from S3 ({max_workers} workers)")
+            logger.info("=" * 60)
+            
+            started = time.monotonic()
+            csv_files, fingerprints, skipped = self._select_csv_files(
+                bucket_name, prefix, table_prefix, incremental
+            )
+            
+            summary = {'succeeded': [], 'failed': [], 'skipped': skipped, 'seconds': 0.0}
+            if not csv_files:
+                if skipped:
+                    logger.info("All CSV files unchanged since last load, nothing to do")
+                else:
+                    logger.warning("No CSV files found in S3 bucket")
+                return summary
+            
+            # Download, parse and load job for each file run in their own worker
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {}
+                for file_key in csv_files:
+                    table_name = self._bronze_table_name(file_key, table_prefix)
+                    future = executor.submit(
+                        self._load_bronze_file, bucket_name, file_key, table_name, load_mode, chunk_size
+                    )
+                    futures[future] = (file_key, table_name)
+                
+                for future in as_completed(futures):
+                    file_key, table_name = futures[future]
+                    try:
+                        result = future.result()
+                        if incremental:
+                            self._record_ingestion(bucket_name, fingerprints[file_key], table_name)
+                        summary['succeeded'].append(result)
+                        logger.info(f"✓ {table_name}: {result['rows']} rows in {result['seconds']}s")
+                    except Exception as e:
+                        logger.error(f"Error processing file {file_key}: {str(e)}")
+                        summary['failed'].append({
+                            'file_key': file_key,
+                            'table_name': table_name,
+                            'error': str(e)
+                        })
+            
+            summary['seconds'] = round(time.monotonic() - started, 2)
+            
+            logger.info("\n" + "=" * 60)
+            logger.info(f"Total Tables Created: {len(summary['succeeded'])}")
+            logger.info(f"Failed Files: {len(summary['failed'])}")
+            logger.info(f"Unchanged Files Skipped: {len(summary['skipped'])}")
+            logger.info(f"Elapsed: {summary['seconds']}s")
+            logger.info("=" * 60)
+            
+            return summary
+            
+        except Exception as e:
+            logger.error(f"Bronze layer creation failed: {str(e)}")
+            raise
+    
+    def _submit_bronze_load(self, bucket_name, file_key, table_name, load_mode):
+        """Start the load job for one CSV without waiting for BigQuery to finish it"""
+        # Tables with natural keys go to their staging table; the merge runs once the job is done
+        keys = self.merge_keys.get(table_name)
+        load_table = self._staging_table_name(table_name) if keys else table_name
+        disposition = 'WRITE_TRUNCATE' if keys else None
+        
+        if load_mode == 'gcs':
+            return self.load_to_bronze_via_gcs(bucket_name, file_key, load_table, disposition, wait=False)
+        if load_mode == 'arrow':
+            return self.load_to_bronze_arrow(bucket_name, file_key, load_table, disposition, wait=False)
+        df = self.extract_csv_from_s3(bucket_name, file_key)
+        return self.load_to_bronze(df, load_table, disposition, wait=False)
+    
+    def wait_for_load_jobs(self, jobs, poll_interval=1.0, max_poll_interval=30.0, backoff=1.5):
+        """Poll submitted load jobs in one loop with backoff until all finish.
+        jobs maps table name to LoadJob; returns per-table completion stats"""
+        pending = dict(jobs)
+        results = {}
+        interval = poll_interval
+        
+        while pending:
+            for table_name, job in list(pending.items()):
+                # done() reloads the job state from the API
+                if not job.done():
+                    continue
+                self.invalidate_metadata(job.destination.table_id)
+                
+                statistics = job.to_api_repr().get('statistics', {})
+                result = {
+                    'job_id': job.job_id,
+                    'state': 'FAILED' if job.error_result else 'DONE',
+                    'rows': job.output_rows,
+                    'bytes_processed': job.input_file_bytes,
+                    'slot_ms': int(statistics.get('totalSlotMs', 0)),
+                    'seconds': (job.ended - job.started).total_seconds() if job.started and job.ended else None
+                }
+                if job.error_result:
+                    result['error'] = job.error_result.get('message')
+                    logger.error(f"✗ {table_name}: {result['error']}")
+                else:
+                    logger.info(f"✓ {table_name}: {result['rows']} rows, "
+                                f"{result['bytes_processed']} bytes, {result['slot_ms']} slot ms")
+                
+                results[table_name] = result
+                del pending[table_name]
+            
+            if pending:
+                time.sleep(interval)
+                interval = min(interval * backoff, max_poll_interval)
+        
+        return results
+    
+    def create_bronze_tables_async(self, bucket_name, prefix='', table_prefix='bronze_', load_mode='arrow',
+                                   poll_interval=1.0, max_poll_interval=30.0):
+        """Submit a load job for every CSV, then track them together so BigQuery runs them concurrently"""
+        if load_mode not in ASYNC_LOAD_MODES:
+            raise ValueError(f"load_mode '{load_mode}' cannot run asynchronously, expected one of {ASYNC_LOAD_MODES}")
+        
+        try:
+            logger.info("=" * 60)
+            logger.info("Creating Bronze Layer Tables from S3 (async load jobs)")
+            logger.info("=" * 60)
+            
+            started = time.monotonic()
+            csv_files = self.extract_all_csv_from_s3(bucket_name, prefix)
+            
+            summary = {'tables': {}, 'failed': [], 'seconds': 0.0}
+            if not csv_files:
+                logger.warning("No CSV files found in S3 bucket")
+                return summary
+            
+            # Submit everything first; nothing here waits on BigQuery
+            jobs, sources = {}, {}
+            for file_key in csv_files:
+                table_name = self._bronze_table_name(file_key, table_prefix)
+                try:
+                    jobs[table_name] = self._submit_bronze_load(bucket_name, file_key, table_name, load_mode)
+                    sources[table_name] = file_key
+                except Exception as e:
+                    logger.error(f"Error submitting file {file_key}: {str(e)}")
+                    summary['failed'].append({'file_key': file_key, 'table_name': table_name, 'error': str(e)})
+            
+            summary['tables'] = self.wait_for_load_jobs(jobs, poll_interval, max_poll_interval)
+            
+            for table_name, result in summary['tables'].items():
+                # The job is finished either way, so its staging copy is no longer needed
+                if load_mode == 'gcs':
+                    self._delete_gcs_staging_blob(sources[table_name])
+                
+                if result['state'] == 'FAILED':
+                    summary['failed'].append({
+                        'file_key': sources[table_name],
+                        'table_name': table_name,
+                        'error': result['error']
+                    })
+                    continue
+                
+                if table_name in self.merge_keys:
+                    try:
+                        self.merge_into_bronze(
+                            self._staging_table_name(table_name), table_name, self.merge_keys[table_name]
+                        )
+                    except Exception as e:
+                        summary['failed'].append({
+                            'file_key': sources[table_name],
+                            'table_name': table_name,
+                            'error': str(e)
+                        })
+            
+            summary['seconds'] = round(time.monotonic() - started, 2)
+            
+            logger.info("\n" + "=" * 60)
+            logger.info(f"Load Jobs Completed: {len(summary['tables'])}")
+            logger.info(f"Failed Files: {len(summary['failed'])}")
+            logger.info(f"Total Bytes Processed: {sum(r['bytes_processed'] or 0 for r in summary['tables'].values())}")
+            logger.info(f"Total Slot Time: {sum(r['slot_ms'] for r in summary['tables'].values())} ms")
+            logger.info(f"Elapsed: {summary['seconds']}s")
+            logger.info("=" * 60)
+            
+            return summary
+            
+        except Exception as e:
+            logger.error(f"Bronze layer creation failed: {str(e)}")
+            raise
+    
+    def create_single_bronze_table(self, bucket_name, file_key, table_name,
+                                   load_mode='dataframe', chunk_size=DEFAULT_CHUNK_SIZE):
       
         try:
             logger.info(f"Creating single bronze table: {table_name}")
             
-            # Extract from S3
-            df = self.extract_csv_from_s3(bucket_name, file_key)
-            
-            # Load to BigQuery
-            self.load_to_bronze(df, table_name)
+            self._load_bronze_file(bucket_name, file_key, table_name, load_mode, chunk_size)
             
             logger.info(f"Successfully created table: {table_name}")
             
@@ -185,11 +984,16 @@ class S3ToBigQueryBronze:
             logger.error(f"Error creating table {table_name}: {str(e)}")
             raise
     
+    def _get_table(self, table_name):
+        """Table metadata (schema, row count, size), served from the metadata cache when fresh"""
+        table_ref = f"{self.project_id}.{self.dataset_id}.{table_name}"
+        return self._cached_metadata(('table', table_name), lambda: self.bq_client.get_table(table_ref))
+    
     def list_bronze_tables(self):
         """List all tables in the bronze layer dataset"""
         try:
             dataset_ref = f"{self.project_id}.{self.dataset_id}"
-            tables = list(self.bq_client.list_tables(dataset_ref))
+            tables = self._cached_metadata(('tables',), lambda: list(self.bq_client.list_tables(dataset_ref)))
             
             if tables:
                 logger.info(f"Tables in {dataset_ref}:")
@@ -207,8 +1011,7 @@ class S3ToBigQueryBronze:
     def get_table_info(self, table_name):
       
         try:
-            table_ref = f"{self.project_id}.{self.dataset_id}.{table_name}"
-            table = self.bq_client.get_table(table_ref)
+            table = self._get_table(table_name)
             
             info = {
                 'table_name': table.table_id,
@@ -231,17 +1034,68 @@ class S3ToBigQueryBronze:
             logger.error(f"Error getting table info: {str(e)}")
             raise
     
-    def preview_table(self, table_name, limit=10):
+    def _preview_via_storage_api(self, table_name, columns, limit):
+        """Read the first rows of a table as Arrow through one Storage Read API stream"""
+        # Optional dependency, only needed for method='storage'
+        from google.cloud import bigquery_storage
         
+        read_client = bigquery_storage.BigQueryReadClient()
+        read_session = bigquery_storage.types.ReadSession(
+            table=f"projects/{self.project_id}/datasets/{self.dataset_id}/tables/{table_name}",
+            data_format=bigquery_storage.types.DataFormat.ARROW,
+            read_options=bigquery_storage.types.ReadSession.TableReadOptions(
+                selected_fields=columns or []
+            )
+        )
+        session = read_client.create_read_session(
+            parent=f"projects/{self.project_id}",
+            read_session=read_session,
+            max_stream_count=1
+        )
+        # No streams means the table is empty
+        if not session.streams:
+            return pa.table({})
+        
+        # Stop pulling pages as soon as we have enough rows
+        batches, num_rows = [], 0
+        reader = read_client.read_rows(session.streams[0].name)
+        for page in reader.rows(session).pages:
+            batch = page.to_arrow()
+            batches.append(batch)
+            num_rows += batch.num_rows
+            if num_rows >= limit:
+                break
+        
+        return pa.Table.from_batches(batches).slice(0, limit)
+    
+    def preview_table(self, table_name, limit=10, columns=None, method='list',
+                      sample_percent=1.0, as_arrow=False):
+        """Preview rows of a bronze table.
+        method='list' reads via tabledata.list, 'storage' via the Storage Read API (neither bills query bytes);
+        'sample' queries TABLESAMPLE SYSTEM and is billed only for the sampled blocks of the selected columns"""
         try:
-            query = f"""
-            SELECT *
-            FROM `{self.project_id}.{self.dataset_id}.{table_name}`
-            LIMIT {limit}
-            """
+            table_ref = f"{self.project_id}.{self.dataset_id}.{table_name}"
             
-            df = self.bq_client.query(query).to_dataframe()
-            logger.info(f"Preview of {table_name} (first {limit} rows):")
+            if method == 'list':
+                table = self._get_table(table_name)
+                selected_fields = [f for f in table.schema if f.name in columns] if columns else None
+                rows = self.bq_client.list_rows(table, selected_fields=selected_fields, max_results=limit)
+                result = rows.to_arrow(create_bqstorage_client=False)
+            elif method == 'storage':
+                result = self._preview_via_storage_api(table_name, columns, limit)
+            elif method == 'sample':
+                select_list = ', '.join(f"`{c}`" for c in columns) if columns else '*'
+                query = f"""
+                SELECT {select_list}
+                FROM `{table_ref}` TABLESAMPLE SYSTEM ({sample_percent} PERCENT)
+                LIMIT {limit}
+                """
+                result = self.bq_client.query(query).to_arrow(create_bqstorage_client=False)
+            else:
+                raise ValueError(f"Unknown preview method '{method}', expected 'list', 'storage' or 'sample'")
+            
+            df = result if as_arrow else result.to_pandas()
+            logger.info(f"Preview of {table_name} (first {limit} rows, {method}):")
             print(df)
             
             return df
@@ -251,7 +1105,6 @@ class S3ToBigQueryBronze:
             raise
 
 
-
 if __name__ == "__main__":
     
     # Get from environment variables
@@ -274,8 +1127,11 @@ if __name__ == "__main__":
     )
     
     # Create bronze tables
-    bronze.create_bronze_tables(
+    bronze.create_bronze_tables_concurrent(
         bucket_name=BUCKET_NAME,
         prefix='movielens/',
-        table_prefix='bronze_'
+        table_prefix='bronze_',
+        max_workers=6,
+        load_mode='arrow',
+        incremental=True
     )
\ No newline at end of file